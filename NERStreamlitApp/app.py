@@ -1,88 +1,51 @@
 try:
-    # Try importing PIL first to ensure it's loaded correctly
-    import PIL
-    print(f"Pillow version: {PIL.__version__}")
-    
-    # Try importing numpy first to ensure correct version is loaded
-    import numpy as np
     import pandas as pd
     import streamlit as st
     import json
-    import io
+    import hashlib
     from typing import Dict, List, Any
-    import os
-    import sys
 
     # Import our modules
-    from ner_processor import NERProcessor
+    from ner_processor import NERProcessor, get_nlp
     from utils import load_sample_texts, validate_pattern, format_pattern_for_display
 except ImportError as e:
     import streamlit as st
-    st.error(f"Import error: {e}")
-    st.info("Trying to fix the installation...")
-    import subprocess
-    try:
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "numpy==1.24.3", "--force-reinstall"])
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", "requirements.txt"])
-        st.info("Dependencies reinstalled. Please refresh the page.")
-    except Exception as install_error:
-        st.error(f"Failed to reinstall dependencies: {install_error}")
+    # Dependencies are installed at build time; reinstalling here can't fix a deployment
+    st.error(f"Missing dependency: {e}. Please rebuild the container with the pinned requirements.")
     st.stop()
 
 # Custom CSS for better visualization
-st.markdown("""
-<style>
-    .main {
-        padding: 1rem 1rem;
-    }
-    .stTextInput > div > div > input {
-        caret-color: #4CAF50;
-    }
-    .entity-table {
-        font-size: 0.9rem;
-    }
-    .css-145kmo2 {
-        font-size: 0.9rem;
+@st.cache_data(show_spinner=False)
+def _css() -> str:
+    """Build the custom style block once per server process."""
+    rules = {
+        ".main": "padding: 1rem 1rem",
+        ".stTextInput > div > div > input": "caret-color: #4CAF50",
+        ".css-145kmo2": "font-size: 0.9rem",
+        ".st-emotion-cache-1y4p8pa": "max-width: 100%",
     }
-    .entity-label {
-        font-weight: bold;
-        padding: 0.2rem 0.5rem;
-        border-radius: 0.5rem;
-        white-space: nowrap;
-    }
-    .st-emotion-cache-1y4p8pa {
-        max-width: 100%;
-    }
-</style>
-""", unsafe_allow_html=True)
-
-# Initialize session state
-if 'ner_processor' not in st.session_state:
-    try:
-        st.session_state.ner_processor = NERProcessor()
-    except Exception as e:
-        st.error(f"Error initializing NER processor: {e}")
-        st.info("Please wait while we try to fix this...")
-        import subprocess
-        try:
-            subprocess.check_call([sys.executable, "-m", "spacy", "download", "en_core_web_sm"])
-            st.session_state.ner_processor = NERProcessor()
-            st.success("Fixed! NER processor initialized successfully.")
-        except Exception as download_error:
-            st.error(f"Failed to download spaCy model: {download_error}")
-        st.stop()
-
-if 'entity_patterns' not in st.session_state:
-    st.session_state.entity_patterns = {}  # {label: [patterns]}
+    return "<style>" + "".join(f"{selector}{{{body}}}" for selector, body in rules.items()) + "</style>"
 
-if 'input_text' not in st.session_state:
-    st.session_state.input_text = ""
+def _digest(data: str) -> str:
+    """Short, stable digest used to key cached NER results."""
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=16).hexdigest()
 
-if 'processed_doc' not in st.session_state:
-    st.session_state.processed_doc = None
-
-if 'show_help' not in st.session_state:
-    st.session_state.show_help = False
+@st.cache_data(max_entries=32, show_spinner=False)
+def run_ner(text_key: str, patterns_key: str, use_statistical: bool, _processor: NERProcessor, _text: str):
+    """
+    Run NER on a text and keep only the displayable results.
+    
+    The cache is keyed on the text and pattern digests and the NER mode; the
+    processor and the raw text are excluded from hashing.
+    """
+    _processor.use_statistical = use_statistical
+    doc = _processor.process_text(_text)
+    entities, label_counts = _processor.get_entities(doc)
+    return {
+        "entities": entities,
+        "label_counts": label_counts,
+        "html": _processor.get_highlighted_html(doc),
+    }
 
 # Functions for adding and removing patterns
 def add_pattern():
@@ -99,24 +62,33 @@ def add_pattern():
         st.error(error_msg)
         return
     
-    # Add pattern to session state
-    if label not in st.session_state.entity_patterns:
-        st.session_state.entity_patterns[label] = []
+    # Register right away so patterns the loaded pipeline can't run are rejected here
+    try:
+        st.session_state.ner_processor.add_entity_patterns(label, [parsed_pattern])
+    except ValueError as e:
+        st.error(str(e))
+        return
     
-    st.session_state.entity_patterns[label].append(parsed_pattern)
+    # Add pattern to session state under a fresh id
+    pid = st.session_state._next_pid
+    st.session_state._next_pid = pid + 1
+    st.session_state.entity_patterns.setdefault(label, {})[pid] = parsed_pattern
     
     # Clear the pattern input
     st.session_state.entity_pattern = ""
 
-def remove_pattern(label, index):
+def remove_pattern(label, pid):
     """Remove a pattern from the entity label."""
     if label in st.session_state.entity_patterns:
-        if 0 <= index < len(st.session_state.entity_patterns[label]):
-            st.session_state.entity_patterns[label].pop(index)
+        if pid in st.session_state.entity_patterns[label]:
+            del st.session_state.entity_patterns[label][pid]
             
             # Remove label if no patterns remain
             if not st.session_state.entity_patterns[label]:
                 del st.session_state.entity_patterns[label]
+            
+            # Matchers can't drop single patterns; the rest are re-added on the next run
+            st.session_state.ner_processor.reset_custom_entities()
 
 def process_text():
     """Process the input text with the NER processor."""
@@ -127,26 +99,27 @@ def process_text():
         st.error("Please enter some text to process")
         return
     
-    # Reset the NER processor
-    st.session_state.ner_processor.reset_custom_entities()
-    
-    # Add all patterns
+    # Add all patterns (ones already registered are skipped)
     for label, patterns in st.session_state.entity_patterns.items():
-        st.session_state.ner_processor.add_entity_patterns(label, patterns)
+        st.session_state.ner_processor.add_entity_patterns(label, list(patterns.values()))
     
-    # Process the text
-    st.session_state.processed_doc = st.session_state.ner_processor.process_text(text)
+    # Process the text, reusing the last results if neither text nor patterns changed
+    text_key = _digest(text)
+    patterns_key = _digest(json.dumps(
+        {label: list(patterns.values()) for label, patterns in st.session_state.entity_patterns.items()},
+        sort_keys=True, default=str
+    ))
+    st.session_state.processed_result = run_ner(
+        text_key, patterns_key, st.session_state.use_statistical, st.session_state.ner_processor, text
+    )
 
 def handle_file_upload():
     """Handle uploaded text file."""
     if st.session_state.uploaded_file is not None:
         text_file = st.session_state.uploaded_file
         
-        # Read as string
-        text_content = io.StringIO(text_file.getvalue().decode("utf-8")).read()
-        
-        # Set input text
-        st.session_state.input_text = text_content
+        # Decode the uploaded bytes once; long texts are batched by the processor
+        st.session_state.input_text = text_file.getvalue().decode("utf-8", errors="replace")
 
 def load_sample_text():
     """Load selected sample text."""
@@ -161,169 +134,202 @@ def clear_all():
     """Clear all entity patterns and text."""
     st.session_state.entity_patterns = {}
     st.session_state.input_text = ""
-    st.session_state.processed_doc = None
+    st.session_state.processed_result = None
     st.session_state.ner_processor.reset_custom_entities()
 
 def toggle_help():
     """Toggle help section visibility."""
     st.session_state.show_help = not st.session_state.show_help
 
-# Application UI
-st.title("🔍 Custom Named Entity Recognition")
+def main():
+    """Draw the app. Entry points call this on every script run."""
+    st.markdown(_css(), unsafe_allow_html=True)
+    
+    # Initialize session state
+    if 'ner_processor' not in st.session_state:
+        try:
+            st.session_state.ner_processor = NERProcessor(get_nlp())
+        except Exception as e:
+            st.error(f"Error initializing NER processor: {e}")
+            st.info("Please verify the spaCy model is installed correctly.")
+            st.stop()
 
-# Main container
-main_container = st.container()
+    if 'entity_patterns' not in st.session_state:
+        st.session_state.entity_patterns = {}  # {label: {pattern_id: pattern}}
 
-with main_container:
-    # Tabs for different sections
-    tab1, tab2, tab3 = st.tabs(["📝 Text Input", "🏷️ Entity Definition", "🔎 Results"])
+    if '_next_pid' not in st.session_state:
+        st.session_state._next_pid = 0
+
+    if 'input_text' not in st.session_state:
+        st.session_state.input_text = ""
+
+    if 'processed_result' not in st.session_state:
+        st.session_state.processed_result = None  # {"entities", "label_counts", "html"}
+
+    if 'show_help' not in st.session_state:
+        st.session_state.show_help = False
     
-    # Tab 1: Text Input
-    with tab1:
-        col1, col2 = st.columns([7, 3])
+    # Application UI
+    st.title("🔍 Custom Named Entity Recognition")
+
+    # Main container
+    main_container = st.container()
+
+    with main_container:
+        # Tabs for different sections
+        tab1, tab2, tab3 = st.tabs(["📝 Text Input", "🏷️ Entity Definition", "🔎 Results"])
+    
+        # Tab 1: Text Input
+        with tab1:
+            col1, col2 = st.columns([7, 3])
         
-        with col1:
-            st.text_area(
-                "Enter text to process:",
-                value=st.session_state.input_text,
-                height=300,
-                key="input_text"
-            )
+            with col1:
+                # Edits are sent together on submit instead of rerunning the script
+                with st.form("text_form", border=False):
+                    st.text_area(
+                        "Enter text to process:",
+                        height=300,
+                        key="input_text"
+                    )
+                    st.form_submit_button("Update Text")
         
-        with col2:
-            st.file_uploader(
-                "Or upload a text file:",
-                type=["txt"],
-                key="uploaded_file",
-                on_change=handle_file_upload
-            )
+            with col2:
+                st.file_uploader(
+                    "Or upload a text file:",
+                    type=["txt"],
+                    key="uploaded_file",
+                    on_change=handle_file_upload
+                )
             
-            sample_texts = load_sample_texts()
-            sample_options = ["None"] + list(sample_texts.keys())
+                if 'sample_options' not in st.session_state:
+                    st.session_state.sample_options = ["None"] + list(load_sample_texts().keys())
             
-            st.selectbox(
-                "Or select a sample text:",
-                options=sample_options,
-                key="selected_sample",
-                on_change=load_sample_text
-            )
+                st.selectbox(
+                    "Or select a sample text:",
+                    options=st.session_state.sample_options,
+                    key="selected_sample",
+                    on_change=load_sample_text
+                )
             
-            st.button("Clear All", on_click=clear_all)
+                st.button("Clear All", on_click=clear_all)
     
-    # Tab 2: Entity Definition
-    with tab2:
-        col1, col2 = st.columns([1, 1])
+        # Tab 2: Entity Definition
+        with tab2:
+            col1, col2 = st.columns([1, 1])
         
-        with col1:
-            st.subheader("Define Custom Entities")
+            with col1:
+                st.subheader("Define Custom Entities")
             
-            st.text_input(
-                "Entity Label (e.g., PRODUCT, COMPANY):",
-                key="entity_label"
-            )
+                st.text_input(
+                    "Entity Label (e.g., PRODUCT, COMPANY):",
+                    key="entity_label"
+                )
             
-            st.text_area(
-                "Entity Pattern:",
-                key="entity_pattern",
-                help="Simple text pattern (e.g., 'Microsoft') or token pattern as JSON array"
-            )
+                st.text_area(
+                    "Entity Pattern:",
+                    key="entity_pattern",
+                    help="Simple text pattern (e.g., 'Microsoft') or token pattern as JSON array"
+                )
             
-            col1_1, col1_2, col1_3 = st.columns([1, 1, 1])
+                col1_1, col1_2, col1_3 = st.columns([1, 1, 1])
             
-            with col1_1:
-                st.button("Add Pattern", on_click=add_pattern)
+                with col1_1:
+                    st.button("Add Pattern", on_click=add_pattern)
             
-            with col1_3:
-                st.button("Help", on_click=toggle_help)
+                with col1_3:
+                    st.button("Help", on_click=toggle_help)
             
-            if st.session_state.show_help:
-                with st.expander("Pattern Examples", expanded=True):
-                    st.markdown("""
-                    ### Simple Text Patterns
-                    Just type the exact text to match: `Microsoft`
+                if st.session_state.show_help:
+                    with st.expander("Pattern Examples", expanded=True):
+                        st.markdown("""
+                        ### Simple Text Patterns
+                        Just type the exact text to match: `Microsoft`
                     
-                    ### Token Patterns (for advanced users)
-                    Use JSON format to define specific token attributes:
-                    ```json
-                    [{"LOWER": "artificial"}, {"LOWER": "intelligence"}]
-                    ```
+                        ### Token Patterns (for advanced users)
+                        Use JSON format to define specific token attributes:
+                        ```json
+                        [{"LOWER": "artificial"}, {"LOWER": "intelligence"}]
+                        ```
                     
-                    Common attributes:
-                    - `LOWER`: Lowercase text
-                    - `TEXT`: Exact text match
-                    - `LEMMA`: Base form of word
-                    - `POS`: Part of speech
-                    - `IS_DIGIT`: True for numbers
+                        Common attributes:
+                        - `LOWER`: Lowercase text
+                        - `TEXT`: Exact text match
+                        - `LEMMA`: Base form of word
+                        - `POS`: Part of speech
+                        - `IS_DIGIT`: True for numbers
                     
-                    [Read more in the spaCy documentation](https://spacy.io/usage/rule-based-matching#entityruler)
-                    """)
+                        [Read more in the spaCy documentation](https://spacy.io/usage/rule-based-matching#entityruler)
+                        """)
         
-        with col2:
-            st.subheader("Current Entity Patterns")
+            with col2:
+                st.subheader("Current Entity Patterns")
             
-            if not st.session_state.entity_patterns:
-                st.info("No entity patterns defined yet. Add some patterns first.")
+                if not st.session_state.entity_patterns:
+                    st.info("No entity patterns defined yet. Add some patterns first.")
             
-            for label, patterns in st.session_state.entity_patterns.items():
-                with st.expander(f"{label} ({len(patterns)} patterns)", expanded=True):
-                    for i, pattern in enumerate(patterns):
-                        col2_1, col2_2 = st.columns([5, 1])
+                for label, patterns in st.session_state.entity_patterns.items():
+                    with st.expander(f"{label} ({len(patterns)} patterns)", expanded=True):
+                        for pid, pattern in patterns.items():
+                            col2_1, col2_2 = st.columns([5, 1])
                         
-                        with col2_1:
-                            st.code(format_pattern_for_display(pattern))
+                            with col2_1:
+                                st.code(format_pattern_for_display(pattern))
                         
-                        with col2_2:
-                            st.button(
-                                "🗑️", 
-                                key=f"remove_{label}_{i}",
-                                on_click=remove_pattern,
-                                args=(label, i)
-                            )
+                            with col2_2:
+                                st.button(
+                                    "🗑️", 
+                                    key=f"remove_{label}_{pid}",
+                                    on_click=remove_pattern,
+                                    args=(label, pid)
+                                )
     
-    # Tab 3: Results
-    with tab3:
-        st.button("Process Text", on_click=process_text)
+        # Tab 3: Results
+        with tab3:
+            st.checkbox(
+                "Use statistical NER",
+                value=True,
+                key="use_statistical",
+                help="Uncheck to find only your custom entities; tokenizing alone is much faster"
+            )
+            st.button("Process Text", on_click=process_text)
         
-        if st.session_state.processed_doc is not None:
-            doc = st.session_state.processed_doc
-            entities = st.session_state.ner_processor.get_entities(doc)
-            highlighted_html = st.session_state.ner_processor.get_highlighted_html(doc)
+            if st.session_state.processed_result is not None:
+                result = st.session_state.processed_result
+                entities = result["entities"]
             
-            # Display highlighted text
-            st.subheader("Text with Highlighted Entities")
-            st.markdown(highlighted_html, unsafe_allow_html=True)
+                # Display highlighted text
+                st.subheader("Text with Highlighted Entities")
+                st.markdown(result["html"], unsafe_allow_html=True)
             
-            # Display entities table
-            st.subheader("Detected Entities")
+                # Display entities table
+                st.subheader("Detected Entities")
             
-            if not entities:
-                st.info("No entities detected. Try adding more patterns or different text.")
-            else:
-                entities_df = pd.DataFrame(entities)
-                entities_df = entities_df[["text", "label", "start", "end"]]
-                entities_df.columns = ["Text", "Label", "Start", "End"]
-                st.dataframe(entities_df, use_container_width=True)
+                if not len(entities["text"]):
+                    st.info("No entities detected. Try adding more patterns or different text.")
+                else:
+                    entities_df = pd.DataFrame({
+                        "Text": entities["text"],
+                        "Label": entities["label"],
+                        "Start": entities["start"],
+                        "End": entities["end"]
+                    })
+                    st.dataframe(entities_df, use_container_width=True)
                 
-                # Entity count by label
-                entity_counts = pd.DataFrame(entities).groupby("label").size().reset_index(name="count")
-                entity_counts.columns = ["Label", "Count"]
+                    # Entity count by label
+                    entity_counts = pd.DataFrame(result["label_counts"].items(), columns=["Label", "Count"])
                 
-                col3_1, col3_2 = st.columns([1, 1])
+                    col3_1, col3_2 = st.columns([1, 1])
                 
-                with col3_1:
-                    st.subheader("Entity Counts")
-                    st.dataframe(entity_counts, use_container_width=True)
+                    with col3_1:
+                        st.subheader("Entity Counts")
+                        st.dataframe(entity_counts, use_container_width=True)
 
-# Footer
-st.markdown("---")
-st.markdown(
-    "Custom Named Entity Recognition App | Built with Streamlit and spaCy | "
-    "[GitHub Repository](https://github.com/Emanuel-TellesChaves/ETELLESCHAVES-Python-Portfolio/tree/main/NERStreamlitApp)"
-)
+    # Footer
+    st.markdown("---")
+    st.markdown(
+        "Custom Named Entity Recognition App | Built with Streamlit and spaCy | "
+        "[GitHub Repository](https://github.com/Emanuel-TellesChaves/ETELLESCHAVES-Python-Portfolio/tree/main/NERStreamlitApp)"
+    )
 
-# Run once at startup to download the model
-if 'model_downloaded' not in st.session_state:
-    with st.spinner('Downloading spaCy model (first run only)...'):
-        # This will download the model if not already installed
-        _ = NERProcessor()
-    st.session_state.model_downloaded = True 
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+"""
+Save a trimmed copy of the spaCy model next to the app.
+
+Run once at build time (setup.sh does this). The app then loads the copy
+from disk instead of resolving the installed package and excluding
+components on every cold start.
+"""
+import importlib
+import os
+
+from ner_processor import EXCLUDED_PIPES, MODEL_DIR
+
+def main(model_name: str = "en_core_web_sm"):
+    """Load the model without the excluded components and write it to MODEL_DIR."""
+    nlp = importlib.import_module(model_name).load(exclude=list(EXCLUDED_PIPES))
+    nlp.to_disk(MODEL_DIR)
+    print(f"Saved {model_name} ({', '.join(nlp.pipe_names)}) to {os.path.relpath(MODEL_DIR)}")
+
+if __name__ == "__main__":
+    main()
@@ -6,9 +6,13 @@ import os
 import sys
 
 # Add the current directory to the path
-current_dir = os.path.dirname(os.path.abspath(__file__))
+# __file__ is already absolute under `streamlit run`
+current_dir = os.path.dirname(__file__) or "."
 if current_dir not in sys.path:
     sys.path.insert(0, current_dir)
 
-# Just import from app.py which has all the Streamlit code
-from app import * 
\ No newline at end of file
+# Just run app.py which has all the Streamlit code; app.main() draws the UI on every run
+import app
+
+app.main()
+ 
\ No newline at end of file
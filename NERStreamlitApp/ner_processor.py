@@ -1,68 +1,153 @@
 import spacy
+from spacy import displacy
 from spacy.tokens import Doc, Span
 from spacy.language import Language
+from spacy.matcher import Matcher
+from spacy.util import filter_spans
 from typing import Dict, List, Tuple, Any
+import importlib
 import json
+import os
+import re
+import numpy as np
+import streamlit as st
 from utils import get_color_for_label
 
+try:
+    import ahocorasick
+except ImportError:  # Optional: exact strings fall back to one regex per label
+    ahocorasick = None
+
+# Inputs longer than this are split into paragraphs and batched through nlp.pipe
+LONG_TEXT_THRESHOLD = 100_000
+BATCH_SIZE = int(os.getenv("NER_BATCH_SIZE", "64"))
+# Worker processes for nlp.pipe; more than one only pays off on very large inputs
+N_PROCESS = int(os.getenv("NER_N_PROCESS", "1"))
+
+# Zero-width split after each blank line so the paragraphs keep their separators
+_PARAGRAPH_BREAK = re.compile(r"(?<=\n\n)")
+
+# Components never loaded; only DEP and sentence-start patterns need the parser
+EXCLUDED_PIPES = ("parser",)
+
+# Trimmed copy of the default model written by build_model.py
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model")
+
+# Components whose output is not needed to display entities
+_OPTIONAL_PIPES = ("tagger", "parser", "attribute_ruler", "lemmatizer")
+
+# Components a token pattern needs to run when it matches on a given attribute
+_ATTR_PIPES = {
+    "TAG": ("tagger",),
+    "POS": ("tagger", "attribute_ruler"),
+    "MORPH": ("tagger", "attribute_ruler"),
+    "LEMMA": ("tagger", "attribute_ruler", "lemmatizer"),
+    "DEP": ("parser",),
+    "SENT_START": ("parser",),
+    "IS_SENT_START": ("parser",),
+}
+
+@st.cache_resource(show_spinner="Loading spaCy model (first run only)...")
+def get_nlp(model_name: str = "en_core_web_sm", exclude: Tuple[str, ...] = EXCLUDED_PIPES):
+    """
+    Load the spaCy pipeline once per process and share it across sessions.
+    
+    Both the app and the debug entry point go through this loader. The model
+    is a pinned requirement, so a missing one fails fast instead of being
+    downloaded at request time.
+    """
+    if model_name == "en_core_web_sm" and os.path.isdir(MODEL_DIR):
+        # Prebuilt at deploy time without the excluded components
+        return spacy.load(MODEL_DIR)
+    
+    # Importing the model package skips spaCy's name lookup across installed packages
+    return importlib.import_module(model_name).load(exclude=list(exclude))
+
+def _is_word_char(char: str) -> bool:
+    """Match the regex notion of a word character (\\w)."""
+    return char.isalnum() or char == "_"
+
 class NERProcessor:
     """Class for handling Named Entity Recognition processing using spaCy."""
     
-    def __init__(self, model_name: str = "en_core_web_sm"):
+    def __init__(self, nlp: Language, use_statistical: bool = True):
         """
-        Initialize the NER processor with a spaCy model.
+        Initialize the NER processor with a loaded spaCy pipeline.
         
         Args:
-            model_name (str): Name of the spaCy model to use
+            nlp (Language): Loaded spaCy pipeline, shared across sessions
+            use_statistical (bool): Run the model's own NER; when False only
+                the custom patterns produce entities
         """
-        try:
-            self.nlp = spacy.load(model_name)
-        except OSError:
-            # If model isn't installed, download it
-            try:
-                spacy.cli.download(model_name)
-                self.nlp = spacy.load(model_name)
-            except Exception as e:
-                # Fallback to loading from the full path
-                import en_core_web_sm
-                self.nlp = en_core_web_sm.load()
-        
-        # Remove the existing entity ruler if present
-        if "entity_ruler" in self.nlp.pipe_names:
-            self.nlp.remove_pipe("entity_ruler")
-        
-        # Add a new entity ruler with higher priority to override existing entities
-        self.ruler = self.nlp.add_pipe("entity_ruler", before="ner")
-        self.ruler.overwrite_ents = True  # Ensure custom entities override existing ones
-        
-        # Store custom entity definitions
-        self.custom_entities = {}
+        self.nlp = nlp
+        self.use_statistical = use_statistical
+        
+        # The pipeline is shared, so custom patterns are matched outside of it
+        # and applied after the statistical components run
+        self.reset_custom_entities()
     
     def add_entity_patterns(self, label: str, patterns: List[Any]):
         """
-        Add entity patterns to the entity ruler.
+        Add entity patterns to the matchers, skipping ones already added.
         
         Args:
             label (str): Entity label
             patterns (List[Any]): List of patterns (strings or dicts)
+            
+        Raises:
+            ValueError: If a token pattern is malformed (spaCy's MatchPatternError)
+                or needs a component the pipeline lacks
         """
-        pattern_list = []
-        
+        # Reject unsupported patterns up front so nothing is half-registered
         for pattern in patterns:
             if isinstance(pattern, str):
-                # Simple string pattern
-                pattern_list.append({"label": label, "pattern": pattern})
-            else:
-                # Dict pattern with token attributes
-                pattern_list.append({"label": label, "pattern": pattern})
+                continue
+            for token in pattern:
+                for attr in token:
+                    missing = [name for name in _ATTR_PIPES.get(attr.upper(), ()) if name not in self.nlp.pipe_names]
+                    if missing:
+                        raise ValueError(f"Attribute {attr} needs the {', '.join(missing)} component, which is not loaded")
+        
+        # Skip patterns that are already registered so re-adding is cheap
+        new_ids = {}
+        for pattern in patterns:
+            pattern_id = (label, json.dumps(pattern, sort_keys=True))
+            if pattern_id not in self._added_pattern_ids:
+                new_ids.setdefault(pattern_id, pattern)
+        new_patterns = list(new_ids.values())
+        phrases = [pattern for pattern in new_patterns if isinstance(pattern, str)]
+        token_patterns = [pattern for pattern in new_patterns if not isinstance(pattern, str)]
         
-        # Add patterns to the ruler
-        self.ruler.add_patterns(pattern_list)
+        if token_patterns:
+            # A scratch matcher raises for malformed patterns without leaving any
+            # of them behind in the live one; only then are they recorded as added
+            Matcher(self.nlp.vocab).add(label, token_patterns)
+            self.ruler.add(label, token_patterns)
+            for pattern in token_patterns:
+                for token in pattern:
+                    for attr in token:
+                        self._required_pipes.update(_ATTR_PIPES.get(attr.upper(), ()))
+        self._added_pattern_ids.update(new_ids)
+        
+        # Add the exact strings to the string matchers
+        if phrases:
+            label_phrases = self._phrases.setdefault(label, [])
+            label_phrases.extend(phrases)
+            if ahocorasick is not None:
+                # Linear-time multi-pattern matching; value is (length, labels)
+                for phrase in phrases:
+                    length, labels = self._automaton.get(phrase, (len(phrase), ()))
+                    if label not in labels:
+                        self._automaton.add_word(phrase, (length, labels + (label,)))
+                self._automaton_ready = False
+            else:
+                # Longest first, since regex alternation takes the first branch that matches
+                alternation = "|".join(map(re.escape, sorted(label_phrases, key=len, reverse=True)))
+                self._fast_re[label] = re.compile(r"(?<!\w)(?:" + alternation + r")(?!\w)")
         
         # Store in custom entities
-        if label not in self.custom_entities:
-            self.custom_entities[label] = []
-        self.custom_entities[label].extend(patterns)
+        if new_patterns:
+            self.custom_entities.setdefault(label, []).extend(new_patterns)
     
     def process_text(self, text: str) -> Doc:
         """
@@ -78,28 +163,127 @@ class NERProcessor:
             # Return empty doc if text is empty
             return self.nlp("")
         
-        return self.nlp(text)
+        if self._can_skip_pipeline():
+            # Only exact strings: the tokenizer is enough to place the spans
+            return self._set_custom_entities(self.nlp.make_doc(text))
+        
+        if len(text) > LONG_TEXT_THRESHOLD:
+            # Split at paragraph boundaries so no entity is cut in half, then
+            # stitch the batched docs back together with the original offsets
+            paragraphs = [p for p in _PARAGRAPH_BREAK.split(text) if p]
+            return Doc.from_docs(self.process_texts(paragraphs), ensure_whitespace=False)
+        
+        return self._set_custom_entities(self.nlp(text, disable=self._disabled_pipes()))
     
-    def get_entities(self, doc: Doc) -> List[Dict[str, Any]]:
+    def process_texts(self, texts: List[str]) -> List[Doc]:
         """
-        Extract entities from a processed document.
+        Process several texts in batches with nlp.pipe.
+        
+        Args:
+            texts (List[str]): Input texts to process
+            
+        Returns:
+            List[Doc]: spaCy Doc objects with entities, in input order
+        """
+        if self._can_skip_pipeline():
+            docs = self.nlp.tokenizer.pipe(texts, batch_size=BATCH_SIZE)
+        else:
+            docs = self.nlp.pipe(texts, batch_size=BATCH_SIZE, n_process=N_PROCESS, disable=self._disabled_pipes())
+        return [self._set_custom_entities(doc) for doc in docs]
+    
+    def _set_custom_entities(self, doc: Doc) -> Doc:
+        """Overlay custom pattern matches on a Doc, overriding overlapping entities."""
+        spans = []
+        if len(self.ruler):
+            spans.extend(Span(doc, start, end, label=match_id) for match_id, start, end in self.ruler(doc))
+        
+        # Exact strings are found on the raw text and kept when they line up with tokens
+        for start, end, label in self._find_phrases(doc.text):
+            span = doc.char_span(start, end, label=label)
+            if span is not None:
+                spans.append(span)
+        
+        if not spans:
+            return doc
+        
+        # Longest match wins between custom patterns, as in spaCy's EntityRuler
+        spans = filter_spans(spans)
+        covered = set()
+        for span in spans:
+            covered.update(range(span.start, span.end))
+        
+        # Keep the statistical entities that don't clash with a custom one
+        kept = [ent for ent in doc.ents if covered.isdisjoint(range(ent.start, ent.end))]
+        doc.ents = sorted(spans + kept, key=lambda span: span.start)
+        return doc
+    
+    def _find_phrases(self, text: str):
+        """Yield (start, end, label) for whole-word occurrences of the exact-string patterns."""
+        if ahocorasick is None:
+            for label, pattern_re in self._fast_re.items():
+                for match in pattern_re.finditer(text):
+                    yield match.start(), match.end(), label
+            return
+        
+        if not self._phrases:
+            return
+        if not self._automaton_ready:
+            self._automaton.make_automaton()
+            self._automaton_ready = True
+        
+        for last, (length, labels) in self._automaton.iter(text):
+            start, end = last - length + 1, last + 1
+            # Same boundaries as the regex fallback: no word character on either side
+            if start > 0 and _is_word_char(text[start - 1]):
+                continue
+            if end < len(text) and _is_word_char(text[end]):
+                continue
+            for label in labels:
+                yield start, end, label
+    
+    def _can_skip_pipeline(self) -> bool:
+        """Whether tokenizing alone is enough, i.e. no component output is needed."""
+        # Without the statistical NER this is the same as a blank pipeline,
+        # unless token patterns match on tags or lemmas
+        return not self.use_statistical and not self._required_pipes
+    
+    def _disabled_pipes(self) -> List[str]:
+        """Components to skip, keeping those the current token patterns rely on."""
+        disabled = [name for name in _OPTIONAL_PIPES if name not in self._required_pipes]
+        if not self.use_statistical and "ner" in self.nlp.pipe_names:
+            disabled.append("ner")
+        return disabled
+    
+    def get_entities(self, doc: Doc) -> Tuple[Dict[str, np.ndarray], Dict[str, int]]:
+        """
+        Extract entities from a processed document as parallel columns.
         
         Args:
             doc (Doc): Processed spaCy Doc
             
         Returns:
-            List[Dict[str, Any]]: List of entity dictionaries
+            Tuple[Dict[str, np.ndarray], Dict[str, int]]:
+                - Arrays keyed by "text", "label", "start", "end" and "color",
+                  one element per entity
+                - Number of entities per label
         """
-        entities = []
-        for ent in doc.ents:
-            entities.append({
-                "text": ent.text,
-                "start": ent.start_char,
-                "end": ent.end_char,
-                "label": ent.label_,
-                "color": get_color_for_label(ent.label_)
-            })
-        return entities
+        ents = doc.ents
+        starts = np.fromiter((ent.start_char for ent in ents), dtype=np.int32, count=len(ents))
+        ends = np.fromiter((ent.end_char for ent in ents), dtype=np.int32, count=len(ents))
+        labels = np.array([ent.label_ for ent in ents], dtype=object)
+        # Slicing the document string once per entity is cheaper than
+        # ent.text, which rebuilds the string from token offsets
+        text = doc.text
+        texts = np.array([text[a:b] for a, b in zip(starts.tolist(), ends.tolist())], dtype=object)
+        
+        # One color computation per distinct label, gathered back per entity;
+        # the same pass yields the per-label counts
+        unique_labels, label_index, counts = np.unique(labels.astype(str), return_inverse=True, return_counts=True)
+        colors = np.array([get_color_for_label(label) for label in unique_labels], dtype=object)[label_index]
+        label_counts = dict(zip(unique_labels.tolist(), counts.tolist()))
+        
+        entities = {"text": texts, "label": labels, "start": starts, "end": ends, "color": colors}
+        return entities, label_counts
     
     def get_highlighted_html(self, doc: Doc) -> str:
         """
@@ -114,33 +298,19 @@ class NERProcessor:
         if not doc.ents:
             return doc.text
         
-        html = ""
-        last_end = 0
-        
-        for ent in doc.ents:
-            # Add text between entities
-            html += doc.text[last_end:ent.start_char]
-            
-            # Add highlighted entity
-            color = get_color_for_label(ent.label_)
-            html += f'<mark style="background-color: {color}; border-radius: 4px; padding: 0.15em 0.3em; margin: 0 0.1em; line-height: 1.5;">{ent.text}<span style="font-size: 0.7em; font-weight: bold; line-height: 1; vertical-align: super; margin-left: 0.3em">{ent.label_}</span></mark>'
-            
-            last_end = ent.end_char
-            
-        # Add any remaining text
-        html += doc.text[last_end:]
-        
-        return html
+        colors = {label: get_color_for_label(label) for label in {ent.label_ for ent in doc.ents}}
+        return displacy.render(doc, style="ent", options={"colors": colors}, page=False, minify=True)
     
     def reset_custom_entities(self):
         """Reset all custom entity patterns."""
-        if "entity_ruler" in self.nlp.pipe_names:
-            self.nlp.remove_pipe("entity_ruler")
-        
-        # Add a new entity ruler with higher priority
-        self.ruler = self.nlp.add_pipe("entity_ruler", before="ner")
-        self.ruler.overwrite_ents = True  # Ensure custom entities override existing ones
+        self.ruler = Matcher(self.nlp.vocab)  # Token-attribute patterns
+        self._phrases = {}  # Exact-string patterns by label
+        self._fast_re = {}  # One compiled alternation per label (regex fallback)
+        self._automaton = ahocorasick.Automaton() if ahocorasick is not None else None
+        self._automaton_ready = False
         self.custom_entities = {}
+        self._added_pattern_ids = set()
+        self._required_pipes = set()
     
     def get_custom_entities(self) -> Dict[str, List[Any]]:
         """
@@ -0,0 +1,21 @@
+"""
+Pack the sample texts into a single JSON file next to the app.
+
+Run at build time (setup.sh does this). load_sample_texts() then reads
+one file instead of opening every sample, and falls back to the .txt
+files when the pack is missing.
+"""
+import json
+import os
+
+from utils import SAMPLE_DIR, SAMPLE_PACK, scan_sample_dir
+
+def main():
+    """Write every sample_texts/*.txt file to SAMPLE_PACK as {filename: content}."""
+    sample_texts = scan_sample_dir(SAMPLE_DIR)
+    with open(SAMPLE_PACK, "w", encoding="utf-8") as file:
+        json.dump(sample_texts, file, ensure_ascii=False)
+    print(f"Packed {len(sample_texts)} sample texts into {os.path.relpath(SAMPLE_PACK)}")
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,12 @@ pip install -r requirements.txt --no-cache-dir --prefer-binary
 # Make sure spaCy model is linked - using the correct version
 python -m spacy link en_core_web_sm-3.7.1 en_core_web_sm
 
+# Save a trimmed copy of the model for faster cold starts
+python build_model.py
+
+# Pack the sample texts into one file
+python pack_samples.py
+
 # Verify installations
 echo "Setup complete!"
 pip list | grep -E "pillow|numpy|pandas|spacy|streamlit"
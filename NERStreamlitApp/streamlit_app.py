@@ -3,10 +3,10 @@ Entry point for Streamlit Cloud deployment.
 """
 import os
 import sys
-import traceback
 
 # Add the current directory to sys.path
-current_dir = os.path.dirname(os.path.abspath(__file__))
+# __file__ is already absolute under `streamlit run`
+current_dir = os.path.dirname(__file__) or "."
 if current_dir not in sys.path:
     sys.path.insert(0, current_dir)
 
@@ -22,8 +22,10 @@ try:
         initial_sidebar_state="expanded"
     )
     
-    # Check if we should run diagnostics (add ?debug=true to URL)
-    debug_mode = st.query_params.get("debug", "false").lower() == "true"
+    # Check if we should run diagnostics (add ?debug=true to URL); read once per session
+    if "debug_mode" not in st.session_state:
+        st.session_state.debug_mode = st.query_params.get("debug", "false").lower() == "true"
+    debug_mode = st.session_state.debug_mode
     
     if debug_mode:
         # Try to import typing to diagnose issues
@@ -32,47 +34,31 @@ try:
             st.write(f"Typing module loaded successfully")
         except Exception as e:
             st.error(f"Error with typing module: {e}")
+            import traceback
             st.code(traceback.format_exc())
             
-        # Try to import pydantic to diagnose issues
-        try:
-            import pydantic
-            st.write(f"Pydantic version: {pydantic.__version__}")
-        except Exception as e:
-            st.error(f"Error with pydantic module: {e}")
-            st.code(traceback.format_exc())
+        # Library versions come from the installed metadata, without importing the packages
+        from importlib.metadata import version, PackageNotFoundError
+        for dist_name in ("pydantic", "Pillow", "numpy", "pandas", "spacy"):
+            try:
+                st.write(f"{dist_name} version: {version(dist_name)}")
+            except PackageNotFoundError:
+                st.error(f"{dist_name} is not installed")
         
-        # Try to load the spaCy model
+        # Try to load the spaCy model through the app's cached loader; this
+        # imports spaCy and pydantic, so their import errors surface here
         try:
-            import spacy
-            st.write(f"spaCy version: {spacy.__version__}")
-            try:
-                import en_core_web_sm
-                nlp = en_core_web_sm.load()
-            except ImportError:
-                # Try loading directly
-                try:
-                    nlp = spacy.load("en_core_web_sm")
-                except Exception as e:
-                    st.error(f"Error loading spaCy model: {e}")
-                    st.info("Please verify the model is installed correctly.")
-                    st.stop()
+            from ner_processor import get_nlp
+            get_nlp()
         except Exception as e:
-            st.error(f"Error with spaCy: {e}")
+            st.error(f"Error loading spaCy model: {e}")
+            st.info("Please verify the model is installed correctly.")
+            import traceback
             st.code(traceback.format_exc())
+            st.stop()
     
-    # Load spaCy model silently if not in debug mode
-    if not debug_mode:
-        try:
-            import spacy
-            try:
-                import en_core_web_sm
-                nlp = en_core_web_sm.load()
-            except ImportError:
-                nlp = spacy.load("en_core_web_sm")
-        except Exception:
-            pass  # Will be handled by the app.py error handling
-            
+    # Outside debug mode the model is loaded lazily, and once per process, by app.py
+
 except ImportError as e:
     import streamlit as st
     st.error(f"Required dependency missing: {e}")
@@ -81,9 +67,13 @@ except ImportError as e:
 
 # Import the app module
 try:
-    from app import *
+    # Importing app only defines its functions; the UI is drawn by app.main(),
+    # which has to run on every rerun of this script
+    import app
+    app.main()
 except Exception as e:
     import streamlit as st
     st.error(f"Error loading application: {e}")
+    import traceback
     st.code(traceback.format_exc())
     st.stop() 
\ No newline at end of file
@@ -1,24 +1,83 @@
 import json
 import os
 import re
+import zlib
+from functools import lru_cache
 from typing import Dict, List, Tuple, Any, Optional
+import streamlit as st
+
+try:
+    import orjson
+except ImportError:  # Optional: the stdlib json module does the same job, more slowly
+    orjson = None
+
+if orjson is not None:
+    _json_loads = orjson.loads
+    
+    def _json_dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode("utf-8")
+    
+    def _json_dumps_indented(obj: Any) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode("utf-8")
+else:
+    _json_loads = json.loads
+    _json_dumps = json.dumps
+    
+    def _json_dumps_indented(obj: Any) -> str:
+        return json.dumps(obj, indent=2)
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_DIR = os.path.join(_APP_DIR, "sample_texts")
+# All samples in one file, written at build time by pack_samples.py
+SAMPLE_PACK = os.path.join(_APP_DIR, "sample_texts.json")
 
 def load_sample_texts() -> Dict[str, str]:
     """
-    Load sample texts from the sample_texts directory.
+    Load sample texts from the packed JSON file, or the sample_texts directory.
     
     Returns:
         Dict[str, str]: Dictionary with filename as key and text content as value
     """
-    sample_texts = {}
-    sample_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample_texts")
+    try:
+        # One open and one parse instead of one open per sample
+        return _read_sample_pack(SAMPLE_PACK, os.stat(SAMPLE_PACK).st_mtime_ns)
+    except FileNotFoundError:
+        pass
     
-    if os.path.exists(sample_dir):
-        for filename in os.listdir(sample_dir):
-            if filename.endswith(".txt"):
-                file_path = os.path.join(sample_dir, filename)
-                with open(file_path, "r", encoding="utf-8") as file:
-                    sample_texts[filename] = file.read()
+    try:
+        # Adding, removing or renaming a sample changes the directory mtime
+        mtime_ns = os.stat(SAMPLE_DIR).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    return _read_sample_texts(SAMPLE_DIR, mtime_ns)
+
+@st.cache_data(show_spinner=False)
+def _read_sample_pack(pack_path: str, mtime_ns: int) -> Dict[str, str]:
+    """Read the packed samples; mtime_ns only keys the cache."""
+    with open(pack_path, "rb") as file:
+        return _json_loads(file.read())
+
+@st.cache_data(show_spinner=False)
+def _read_sample_texts(sample_dir: str, mtime_ns: int) -> Dict[str, str]:
+    """Read every .txt file in sample_dir; mtime_ns only keys the cache."""
+    return scan_sample_dir(sample_dir)
+
+def scan_sample_dir(sample_dir: str = SAMPLE_DIR) -> Dict[str, str]:
+    """
+    Read every .txt file in a directory.
+    
+    Args:
+        sample_dir (str): Directory holding the sample texts
+        
+    Returns:
+        Dict[str, str]: Dictionary with filename as key and text content as value
+    """
+    sample_texts = {}
+    with os.scandir(sample_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith(".txt") and entry.is_file():
+                with open(entry.path, "r", encoding="utf-8") as file:
+                    sample_texts[entry.name] = file.read()
     
     return sample_texts
 
@@ -35,17 +94,43 @@ def validate_pattern(pattern: str) -> Tuple[bool, Optional[str], Any]:
             - Error message if any
             - Parsed pattern if valid
     """
-    if not pattern.strip():
+    pattern = pattern.strip()
+    if not pattern:
         return False, "Pattern cannot be empty", None
     
     # Check if it's a simple phrase pattern
     if not (pattern.startswith('[') and pattern.endswith(']')):
         # Simple string pattern
-        return True, None, pattern.strip()
+        return True, None, pattern
+    
+    # A list of dictionaries needs at least one brace; skip parsing otherwise
+    if '{' not in pattern:
+        return False, "Pattern must be a list of dictionaries", None
     
     # It should be a JSON pattern
+    is_valid, error_msg, pattern_json = _parse_token_pattern(pattern)
+    if not is_valid:
+        return False, error_msg, None
+    
+    # Hand out a fresh copy so callers can't mutate the cached result
+    return True, None, _json_loads(pattern_json)
+
+@lru_cache(maxsize=512)
+def _parse_token_pattern(pattern: str) -> Tuple[bool, Optional[str], Optional[str]]:
+    """
+    Parse and validate a JSON token pattern, memoized on the raw string.
+    
+    Args:
+        pattern (str): The JSON pattern string
+        
+    Returns:
+        Tuple[bool, Optional[str], Optional[str]]:
+            - Success status
+            - Error message if any
+            - Compact JSON of the parsed pattern if valid
+    """
     try:
-        parsed_pattern = json.loads(pattern)
+        parsed_pattern = _json_loads(pattern)
         # Verify it's a list of dictionaries
         if not isinstance(parsed_pattern, list):
             return False, "Pattern must be a list of dictionaries", None
@@ -54,10 +139,11 @@ def validate_pattern(pattern: str) -> Tuple[bool, Optional[str], Any]:
             if not isinstance(item, dict):
                 return False, "Each item in pattern must be a dictionary", None
         
-        return True, None, parsed_pattern
-    except json.JSONDecodeError as e:
+        return True, None, _json_dumps(parsed_pattern)
+    except json.JSONDecodeError as e:  # orjson's error subclasses this one
         return False, f"Invalid JSON: {str(e)}", None
 
+@lru_cache(maxsize=512)
 def get_color_for_label(label: str) -> str:
     """
     Generate a consistent color for a given entity label.
@@ -69,7 +155,7 @@ def get_color_for_label(label: str) -> str:
         str: Hex color code
     """
     # Generate a deterministic but distributed color based on the label
-    label_sum = sum(ord(c) for c in label)
+    label_sum = zlib.crc32(label.encode("utf-8"))
     hue = (label_sum * 137.5) % 360
     
     # Convert HSV to RGB (simplified with saturation=60%, value=90%)
@@ -81,18 +167,8 @@ def get_color_for_label(label: str) -> str:
     x = c * (1 - abs(h % 2 - 1))
     m = v - c
     
-    if 0 <= h < 1:
-        r, g, b = c, x, 0
-    elif 1 <= h < 2:
-        r, g, b = x, c, 0
-    elif 2 <= h < 3:
-        r, g, b = 0, c, x
-    elif 3 <= h < 4:
-        r, g, b = 0, x, c
-    elif 4 <= h < 5:
-        r, g, b = x, 0, c
-    else:
-        r, g, b = c, 0, x
+    # Pick the RGB ordering for the hue's sextant by index instead of branching
+    r, g, b = ((c, x, 0), (x, c, 0), (0, c, x), (0, x, c), (x, 0, c), (c, 0, x))[int(h) % 6]
     
     r = int((r + m) * 255)
     g = int((g + m) * 255)
@@ -113,5 +189,12 @@ def format_pattern_for_display(pattern: Any) -> str:
     if isinstance(pattern, str):
         return f'"{pattern}"'
     elif isinstance(pattern, list):
-        return json.dumps(pattern, indent=2)
-    return str(pattern) 
\ No newline at end of file
+        # Compact dumps is C-accelerated; the indented one is cached
+        return _indent_pattern_json(_json_dumps(pattern))
+    return str(pattern)
+
+@lru_cache(maxsize=512)
+def _indent_pattern_json(pattern_json: str) -> str:
+    """Pretty-print a compact JSON pattern for display."""
+    return _json_dumps_indented(_json_loads(pattern_json))
+ 
\ No newline at end of file
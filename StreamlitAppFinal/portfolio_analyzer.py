@@ -5,6 +5,9 @@ import yfinance as yf
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+import hashlib
 import io
 
 # --- Set page config first ---
@@ -16,7 +19,7 @@ st.set_page_config(
 )
 
 # Custom CSS for better UI with dark theme
-st.markdown("""
+_CSS_HTML = """
 <style>
     body {
         color: #FFFFFF;
@@ -125,66 +128,158 @@ st.markdown("""
         color: #E0E0E0;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+# st.html skips the markdown parser; older Streamlit versions only have st.markdown
+if hasattr(st, "html"):
+    st.html(_CSS_HTML)
+else:
+    st.markdown(_CSS_HTML, unsafe_allow_html=True)
+
+# --- Chart styling ---
+# Built once per process; only the growth chart's y-axis range changes per run
+_GROWTH_YAXIS = dict(title='Value ($)', tickprefix='$', autorange=False)
+_GROWTH_LAYOUT = dict(
+    title=None,
+    xaxis_title='Date',
+    template='plotly_white',
+    hovermode='x unified',
+    height=500,
+    legend=dict(
+        orientation="h",
+        yanchor="bottom",
+        y=1.02,
+        xanchor="right",
+        x=1
+    ),
+    margin=dict(l=60, r=30, t=30, b=60),
+    paper_bgcolor='rgba(0,0,0,0)',  # Transparent background
+    plot_bgcolor='rgba(0,0,0,0)',   # Transparent plot background
+    font=dict(color='#E0E0E0')      # White text
+)
+
+# Custom color sequence for pie chart
+_PIE_COLORS = tuple(px.colors.qualitative.Safe)
+_PIE_LAYOUT = dict(
+    showlegend=True,
+    height=400,
+    paper_bgcolor='rgba(0,0,0,0)',  # Transparent background
+    plot_bgcolor='rgba(0,0,0,0)',   # Transparent plot area
+    margin=dict(l=0, r=0, t=0, b=0),  # No margins
+    legend=dict(
+        orientation="h",
+        yanchor="bottom",
+        y=-0.1,
+        xanchor="center",
+        x=0.5,
+        font=dict(color="white")
+    )
+)
+
+# Metric explanations as a prebuilt HTML list, so no markdown has to be parsed
+_METRICS_HTML = """
+<ul>
+    <li><b>Total Return (%)</b>: Overall percentage gain/loss over the entire period</li>
+    <li><b>Annualized Return (%)</b>: Return averaged to an annual basis</li>
+    <li><b>Annualized Volatility (%)</b>: Measure of risk/variability in returns</li>
+    <li><b>Sharpe Ratio</b>: Risk-adjusted return (higher is better)</li>
+    <li><b>Sortino Ratio</b>: Similar to Sharpe but only considers downside risk</li>
+    <li><b>Max Drawdown (%)</b>: Largest percentage drop from peak to trough</li>
+</ul>
+"""
 
 # --- Helper Functions ---
 
-@st.cache_data(ttl=3600) # Cache data for 1 hour
-def fetch_data(tickers: list[str], start_date: str, end_date: str) -> tuple[pd.DataFrame | None, list[str]]:
-    """Fetches adjusted closing prices for a list of tickers."""
-    invalid_tickers = []
-    all_data = None # Initialize
+@st.cache_resource
+def _yf_session():
+    """
+    One pooled HTTP session shared by every yfinance call, so reruns reuse
+    open connections instead of paying a TLS handshake each time.
+    """
+    try:
+        # Recent yfinance releases only accept curl_cffi sessions
+        from curl_cffi import requests as curl_requests
+        return curl_requests.Session(impersonate="chrome")
+    except ImportError:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        session = requests.Session()
+        retry = Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+        session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=50, max_retries=retry))
+        return session
+
+@st.cache_resource(ttl=3600, show_spinner=False) # Cache each ticker for 1 hour
+def _fetch_one(ticker: str, start_date: pd.Timestamp, end_date: pd.Timestamp) -> pd.Series:
+    """
+    Fetches adjusted closing prices for a single ticker, named after it.
+    Returns an empty Series when Yahoo has no data for the ticker.
+    The Series is the cached object itself and is shared across sessions:
+    treat it as read-only.
+    """
+    # Ticker.history is used rather than yf.download, which shares module-level
+    # state between calls and is not safe to run from several threads
+    history = yf.Ticker(ticker, session=_yf_session()).history(
+        start=start_date, end=end_date, auto_adjust=True, actions=False
+    )
+    if history.empty or 'Close' not in history.columns:
+        return pd.Series(dtype=np.float64, name=ticker)
+    close = history['Close'].rename(ticker)
+    # Drop the exchange timezone so tickers from different exchanges share one daily index
+    if close.index.tz is not None:
+        close.index = close.index.tz_localize(None)
+    return close
+
+def fetch_data(tickers: tuple[str, ...], start_date: pd.Timestamp, end_date: pd.Timestamp) -> tuple[pd.DataFrame | None, list[str]]:
+    """
+    Fetches adjusted closing prices for a list of tickers.
+
+    Each ticker is downloaded (and cached) separately in a thread pool, so
+    changing one portfolio ticker does not refetch the others or the benchmark.
+    The returned DataFrame is built fresh from the cached series on every call.
+    """
     try:
-        # Download data without immediately selecting 'Adj Close'
-        # Use actions=False to potentially avoid issues with dividends/splits data structure
-        all_data = yf.download(tickers, start=start_date, end=end_date, progress=False, actions=False)
+        with ThreadPoolExecutor(max_workers=min(10, len(tickers))) as pool:
+            closes = list(pool.map(_fetch_one, tickers, repeat(start_date), repeat(end_date)))
 
-        if all_data is None or all_data.empty:
-            st.warning(f"yfinance returned no data for tickers: {', '.join(tickers)} in the specified date range.")
-            return None, tickers
-
-        # Now, try to access 'Adj Close' or 'Close'
-        data = None
-        if isinstance(all_data.columns, pd.MultiIndex): # Common for multiple tickers
-            if 'Adj Close' in all_data.columns.get_level_values(0):
-                data = all_data['Adj Close']
-            elif 'Close' in all_data.columns.get_level_values(0): # Fallback to 'Close'
-                # Silently fall back to Close prices without warning
-                data = all_data['Close']
-            else:
-                st.error("Could not find 'Adj Close' or 'Close' columns in the downloaded multi-index data.")
-                return None, tickers
-        elif 'Adj Close' in all_data.columns: # Single ticker case
-            data = all_data[['Adj Close']] # Keep as DataFrame
-            if len(tickers) == 1: data.columns = tickers # Rename column
-        elif 'Close' in all_data.columns: # Fallback for single ticker
-            # Silently fall back to Close prices without warning
-            data = all_data[['Close']] # Keep as DataFrame
-            if len(tickers) == 1: data.columns = tickers # Rename column
-        else:
-            st.error("Downloaded data structure is unexpected and does not contain 'Adj Close' or 'Close'.")
-            st.dataframe(all_data.head()) # Show structure for debugging
-            return None, tickers
+        # Outer join on dates, kept in date order; tickers without data become all-NaN columns
+        data = pd.concat(closes, axis=1, sort=True)
 
-        if data is None or data.empty:
-            st.error("Could not extract valid price data ('Adj Close' or 'Close') from download.")
-            return None, tickers # No valid price data extracted
+        if data.empty:
+            st.warning(f"yfinance returned no data for tickers: {', '.join(tickers)} in the specified date range.")
+            return None, list(tickers)
 
         # Data extracted, proceed with validation
+        # A single NaN mask drives the column check, the row drop and the fills below
+        values = data.to_numpy(dtype=np.float64)
+        missing = np.isnan(values)
+
         # Check for columns that are all NaN (often indicates ticker download failure)
-        invalid_tickers_nan = [ticker for ticker in data.columns if data[ticker].isnull().all()]
-        valid_data = data.drop(columns=invalid_tickers_nan)
+        nan_mask = missing.all(axis=0)
+        invalid_tickers_nan = data.columns[nan_mask].tolist()
 
-        if valid_data.empty:
+        if nan_mask.all():
             st.warning(f"All fetched tickers ({', '.join(data.columns)}) had only NaN values in the date range.")
             return None, list(set(tickers)) # Return all originally requested tickers as potentially invalid
 
         # Drop rows where all remaining valid columns are NaN (handles potential gaps)
-        valid_data.dropna(axis=0, how='all', inplace=True)
+        keep_rows = ~missing[:, ~nan_mask].all(axis=1)
+        values = values[np.ix_(keep_rows, ~nan_mask)]
+        missing = missing[np.ix_(keep_rows, ~nan_mask)]
 
-        # Fill intermediate NaNs using forward fill, then backward fill
-        valid_data.ffill(inplace=True)
-        valid_data.bfill(inplace=True)
+        # Forward fill: every cell takes the value of the last valid row at or above it
+        rows = np.arange(values.shape[0])
+        cols = np.arange(values.shape[1])
+        last_valid = np.where(missing, 0, rows[:, None])
+        np.maximum.accumulate(last_valid, axis=0, out=last_valid)
+        values = values[last_valid, cols]
+
+        # Backward fill what is left, i.e. the leading gap of tickers that start trading later
+        first_valid = missing.argmin(axis=0)
+        values = np.where(np.isnan(values), values[first_valid, cols], values)
+
+        valid_data = pd.DataFrame(values, index=data.index[keep_rows], columns=data.columns[~nan_mask])
 
         # Check again if empty after NaN handling
         if valid_data.empty:
@@ -197,118 +292,200 @@ def fetch_data(tickers: list[str], start_date: str, end_date: str) -> tuple[pd.D
 
         return valid_data, invalid_tickers_final
 
-    except KeyError as ke:
-         st.error(f"Data fetching error: Could not process downloaded data due to unexpected structure ({ke}). Check ticker validity and data availability.")
-         if all_data is not None:
-             st.write("Downloaded data structure (first 5 rows):")
-             st.dataframe(all_data.head()) # Show head of data for debugging
-         return None, tickers
     except Exception as e:
         st.error(f"An unexpected error occurred during data fetching: {e}")
         # Consider logging the full traceback here for advanced debugging
-        return None, tickers
-
-def calculate_metrics(portfolio_returns: pd.Series, benchmark_returns: pd.Series, risk_free_rate: float = 0.0) -> dict:
-    """Calculates key performance metrics."""
-    metrics = {}
+        return None, list(tickers)
+
+def simple_returns(prices: pd.DataFrame) -> pd.DataFrame:
+    """Day-over-day returns of gap-free price columns, without pandas' pct_change machinery."""
+    arr = prices.to_numpy(dtype=np.float64)
+    return pd.DataFrame(arr[1:] / arr[:-1] - 1.0, index=prices.index[1:], columns=prices.columns)
+
+def _return_stats(r: np.ndarray) -> tuple:
+    """
+    Growth factor, variance, negative-return count and variance, and max drawdown
+    of a return series. NaN returns are skipped; variances use ddof=1 to match
+    pandas' std().
+    """
+    r = r[~np.isnan(r)]
+    if r.size == 0:
+        return 1.0, np.nan, 0, np.nan, np.nan
+    wealth = np.cumprod(1.0 + r)
+    peak = np.maximum.accumulate(wealth)
+    negative = r[r < 0]
+    variance = r.var(ddof=1) if r.size > 1 else np.nan
+    variance_neg = negative.var(ddof=1) if negative.size > 1 else np.nan
+    return wealth[-1], variance, negative.size, variance_neg, ((wealth - peak) / peak).min()
+
+def _metrics_core(r: np.ndarray, risk_free_rate: float, trading_days: int) -> tuple:
+    """
+    Total return, annualized return (CAGR), annualized volatility, Sharpe,
+    Sortino and max drawdown of a daily return series.
+    """
+    if r.size == 0:
+        return np.nan, np.nan, np.nan, np.nan, np.nan, np.nan
+
+    growth, variance, n_negative, negative_variance, max_drawdown = _return_stats(r)
+    total_return = growth - 1.0
+
+    # Geometric Mean for Annualized Return (CAGR)
+    years = r.size / trading_days
+    annualized_return = np.nan # Used for the ratios
+    cagr = np.nan # Reported value
+    if years > 0:
+        if growth > 0:
+            annualized_return = growth ** (1.0 / years) - 1.0
+            cagr = annualized_return
+        else:
+            # Handle cases with >100% loss (np.isclose(growth, 0) with default tolerance)
+            annualized_return = -1.0
+            if abs(growth) <= 1e-8:
+                cagr = -1.0
+
+    volatility = np.sqrt(variance) * np.sqrt(trading_days)
+
+    # Sharpe Ratio
+    sharpe = np.nan
+    if volatility != 0 and not np.isnan(annualized_return):
+        sharpe = (annualized_return - risk_free_rate) / volatility
+
+    # Sortino Ratio
+    sortino = np.nan
+    if n_negative > 0:
+        downside_deviation = np.sqrt(negative_variance) * np.sqrt(trading_days)
+        if downside_deviation != 0 and not np.isnan(annualized_return):
+            sortino = (annualized_return - risk_free_rate) / downside_deviation
+    else: # No negative returns
+        sortino = np.inf if annualized_return > risk_free_rate else 0.0
+
+    return total_return, cagr, volatility, sharpe, sortino, max_drawdown
+
+def calculate_metrics(portfolio_returns: np.ndarray, benchmark_returns: np.ndarray | None, risk_free_rate: float = 0.0) -> dict:
+    """Calculates key performance metrics. Pass None for benchmark_returns when there is no benchmark."""
     trading_days = 252 # Standard assumption
 
     # --- Portfolio Metrics ---
-    if portfolio_returns is not None and not portfolio_returns.empty:
-        cumulative_portfolio_return = (1 + portfolio_returns).prod() - 1
-        metrics['Total Portfolio Return (%)'] = cumulative_portfolio_return * 100
-
-        # Geometric Mean for Annualized Return (CAGR)
-        years = len(portfolio_returns) / trading_days
-        if years > 0:
-            # Ensure the base is positive before exponentiation
-            base = 1 + cumulative_portfolio_return
-            if base > 0:
-                 annualized_portfolio_return = (base ** (1 / years)) - 1
-                 metrics['Annualized Portfolio Return (%)'] = annualized_portfolio_return * 100
-            else:
-                 # Handle cases with >100% loss
-                 metrics['Annualized Portfolio Return (%)'] = -100.0 if np.isclose(base, 0) else np.nan
-                 annualized_portfolio_return = -1.0 # Set for Sharpe calculation if needed
-        else:
-            metrics['Annualized Portfolio Return (%)'] = np.nan # Avoid division by zero
-            annualized_portfolio_return = np.nan
-
-        annualized_portfolio_volatility = portfolio_returns.std() * np.sqrt(trading_days)
-        metrics['Annualized Portfolio Volatility (%)'] = annualized_portfolio_volatility * 100
-
-        # Sharpe Ratio
-        if annualized_portfolio_volatility != 0 and not np.isnan(annualized_portfolio_return):
-            metrics['Portfolio Sharpe Ratio'] = (annualized_portfolio_return - risk_free_rate) / annualized_portfolio_volatility
-        else:
-            metrics['Portfolio Sharpe Ratio'] = np.nan
-
-        # Sortino Ratio
-        negative_returns = portfolio_returns[portfolio_returns < 0]
-        if not negative_returns.empty:
-            downside_deviation = negative_returns.std() * np.sqrt(trading_days)
-            if downside_deviation != 0 and not np.isnan(annualized_portfolio_return):
-                metrics['Portfolio Sortino Ratio'] = (annualized_portfolio_return - risk_free_rate) / downside_deviation
-            else:
-                metrics['Portfolio Sortino Ratio'] = np.nan # Handle zero downside deviation or NaN return
-        else: # No negative returns
-             metrics['Portfolio Sortino Ratio'] = np.inf if annualized_portfolio_return > risk_free_rate else 0.0 # Or np.nan? inf is common
-
-        # Max Drawdown
-        cumulative_wealth = (1 + portfolio_returns).cumprod()
-        rolling_max = cumulative_wealth.cummax()
-        drawdown = (cumulative_wealth - rolling_max) / rolling_max
-        max_drawdown_value = drawdown.min()
-        metrics['Portfolio Max Drawdown (%)'] = max_drawdown_value * 100 if not pd.isna(max_drawdown_value) else np.nan
-
-    else: # Handle case where portfolio returns are None or empty
-        metrics.update({
-            'Total Portfolio Return (%)': np.nan,
-            'Annualized Portfolio Return (%)': np.nan,
-            'Annualized Portfolio Volatility (%)': np.nan,
-            'Portfolio Sharpe Ratio': np.nan,
-            'Portfolio Sortino Ratio': np.nan,
-            'Portfolio Max Drawdown (%)': np.nan
-        })
-        annualized_portfolio_return = np.nan # Ensure this is defined
-
+    total, cagr, volatility, sharpe, sortino, max_drawdown = _metrics_core(
+        portfolio_returns, float(risk_free_rate), trading_days
+    )
+    metrics = {
+        'Total Portfolio Return (%)': total * 100,
+        'Annualized Portfolio Return (%)': cagr * 100,
+        'Annualized Portfolio Volatility (%)': volatility * 100,
+        'Portfolio Sharpe Ratio': sharpe,
+        'Portfolio Sortino Ratio': sortino,
+        'Portfolio Max Drawdown (%)': max_drawdown * 100
+    }
 
     # --- Benchmark Metrics ---
-    if benchmark_returns is not None and not benchmark_returns.empty:
-        cumulative_benchmark_return = (1 + benchmark_returns).prod() - 1
-        metrics['Total Benchmark Return (%)'] = cumulative_benchmark_return * 100
-
-        # Geometric Mean for Annualized Return (CAGR)
-        years_bm = len(benchmark_returns) / trading_days
-        if years_bm > 0:
-            base_bm = 1 + cumulative_benchmark_return
-            if base_bm > 0:
-                annualized_benchmark_return = (base_bm ** (1 / years_bm)) - 1
-                metrics['Annualized Benchmark Return (%)'] = annualized_benchmark_return * 100
-            else:
-                metrics['Annualized Benchmark Return (%)'] = -100.0 if np.isclose(base_bm, 0) else np.nan
-                annualized_benchmark_return = -1.0 # Set for Sharpe calculation
-        else:
-            metrics['Annualized Benchmark Return (%)'] = np.nan
-            annualized_benchmark_return = np.nan
+    if benchmark_returns is None:
+        total_bm = cagr_bm = volatility_bm = sharpe_bm = np.nan
+    else:
+        total_bm, cagr_bm, volatility_bm, sharpe_bm, _, _ = _metrics_core(
+            benchmark_returns, float(risk_free_rate), trading_days
+        )
+    metrics.update({
+        'Total Benchmark Return (%)': total_bm * 100,
+        'Annualized Benchmark Return (%)': cagr_bm * 100,
+        'Annualized Benchmark Volatility (%)': volatility_bm * 100,
+        'Benchmark Sharpe Ratio': sharpe_bm
+    })
 
-        annualized_benchmark_volatility = benchmark_returns.std() * np.sqrt(trading_days)
-        metrics['Annualized Benchmark Volatility (%)'] = annualized_benchmark_volatility * 100
+    return metrics
 
-        # Benchmark Sharpe (Optional but good for comparison)
-        if annualized_benchmark_volatility != 0 and not np.isnan(annualized_benchmark_return):
-            metrics['Benchmark Sharpe Ratio'] = (annualized_benchmark_return - risk_free_rate) / annualized_benchmark_volatility
+def price_digest(prices: pd.DataFrame) -> str:
+    """Digest of a price frame's dates and values; it changes whenever the prices are re-fetched with new data."""
+    return hashlib.blake2b(pd.util.hash_pandas_object(prices).to_numpy().tobytes(), digest_size=16).hexdigest()
+
+@st.cache_data(ttl=3600, show_spinner=False) # Keyed on the price digest, so re-fetched prices never hit a stale entry
+def compute_analysis(fetch_key: tuple, tickers: tuple[str, ...], weights: tuple[float, ...], benchmark_ticker: str | None,
+                     initial_investment: float, risk_free_rate: float, _raw_data: pd.DataFrame) -> dict:
+    """
+    Daily portfolio returns, the growth path of the investment and the metrics for a
+    validated portfolio. weights are percentages in the order of tickers; benchmark_ticker
+    is None when there is no usable benchmark. The price frame is not hashed: fetch_key,
+    the fetch_data arguments it came from plus its price_digest, stands in for it in the
+    cache key.
+    """
+    # Select final valid portfolio data; its columns follow the order of tickers
+    portfolio_data = _raw_data[list(tickers)]
+    aligned_weights = np.asarray(weights, dtype=np.float64) / 100.0 # Convert to decimal
+
+    # Calculate daily returns
+    # Prices are already forward/back filled, so only the first row has no return
+    portfolio_returns_data = simple_returns(portfolio_data)
+
+    # Weighted daily portfolio return as one matrix-vector product; missing
+    # returns count as zero, as they did with the skipna row sum
+    returns_matrix = np.nan_to_num(portfolio_returns_data.to_numpy(dtype=np.float64))
+    portfolio_daily_returns = pd.Series(
+        returns_matrix @ aligned_weights,
+        index=portfolio_returns_data.index
+    )
+
+    # Check if returns are extremely small/constant
+    constant_returns = bool(portfolio_daily_returns.std() < 1e-10)
+
+    # Prepare benchmark returns if valid
+    benchmark_daily_returns = None
+    tracks_benchmark = False
+    if benchmark_ticker is not None:
+        benchmark_daily_returns = simple_returns(_raw_data[[benchmark_ticker]])[benchmark_ticker] # Convert to Series
+
+        # Align dates using intersection (IMPORTANT!)
+        common_index = portfolio_daily_returns.index.intersection(benchmark_daily_returns.index)
+        portfolio_daily_returns = portfolio_daily_returns.loc[common_index]
+        benchmark_daily_returns = benchmark_daily_returns.loc[common_index]
+
+        # Verify the data is different
+        correlation = portfolio_daily_returns.corr(benchmark_daily_returns)
+        tracks_benchmark = bool(np.isclose(correlation, 1.0, atol=1e-4))
+
+    # --- Calculate cumulative portfolio/benchmark VALUES for visualization ---
+    perf_df = pd.DataFrame()
+    if not portfolio_daily_returns.empty:
+        # One preallocated block: row 0 holds the initial investment the day
+        # before the first return, rows 1..n the compounded values
+        n = len(portfolio_daily_returns)
+        perf_index = portfolio_daily_returns.index.insert(0, portfolio_daily_returns.index[0] - pd.Timedelta(days=1))
+        perf_values = np.empty((n + 1, 2))
+        perf_values[0, 0] = initial_investment
+        # Compound straight into the column: 1 + r, running product, scale
+        growth = perf_values[1:, 0]
+        np.add(portfolio_daily_returns.to_numpy(), 1.0, out=growth)
+        np.cumprod(growth, out=growth)
+        growth *= initial_investment
+
+        if benchmark_daily_returns is not None and not benchmark_daily_returns.empty:
+            # Benchmark returns were aligned to the portfolio dates above
+            perf_values[0, 1] = initial_investment
+            growth = perf_values[1:, 1]
+            np.add(benchmark_daily_returns.to_numpy(), 1.0, out=growth)
+            np.cumprod(growth, out=growth)
+            growth *= initial_investment
         else:
-            metrics['Benchmark Sharpe Ratio'] = np.nan
-    else: # Handle case where benchmark returns are None or empty
-        metrics.update({
-             'Total Benchmark Return (%)': np.nan,
-            'Annualized Benchmark Return (%)': np.nan,
-            'Annualized Benchmark Volatility (%)': np.nan,
-            'Benchmark Sharpe Ratio': np.nan
-        })
-
-    return metrics
+            # Keep NaN if no benchmark
+            perf_values[0, 1] = initial_investment if benchmark_ticker is not None else np.nan
+            perf_values[1:, 1] = np.nan
+
+        perf_df = pd.DataFrame(perf_values, index=perf_index, columns=['Portfolio_Value', 'Benchmark_Value'])
+
+    # --- Calculate Metrics ---
+    # Pass the aligned daily returns to the metrics function; None means no benchmark
+    metrics = calculate_metrics(
+        portfolio_daily_returns.to_numpy(dtype=np.float64),
+        None if benchmark_daily_returns is None else benchmark_daily_returns.to_numpy(dtype=np.float64),
+        risk_free_rate
+    )
+
+    return {
+        'portfolio_daily_returns': portfolio_daily_returns,
+        'perf_df': perf_df,
+        'metrics': metrics,
+        'constant_returns': constant_returns,
+        'tracks_benchmark': tracks_benchmark,
+    }
 
 # --- Streamlit App Layout ---
 st.markdown('<h1 class="main-header">📈 Portfolio Performance Analyzer</h1>', unsafe_allow_html=True)
@@ -377,15 +554,20 @@ with st.sidebar:
             type="primary"
         )
 
+    # Price downloads are cached for an hour; this drops them so the next run refetches
+    if st.button("🔄 Refresh data", use_container_width=True, help="Discard cached prices and download fresh data on the next run."):
+        _fetch_one.clear()
+        compute_analysis.clear()
+
 # --- Main Panel Logic ---
 if submitted:
     with st.spinner('Running analysis... Please wait.'):
         # --- 1. Input Validation and Portfolio Parsing ---
         valid_input = True
         weights_sum_100 = True # Assume true initially
-        tickers = []
-        weights = []
-        portfolio_df = pd.DataFrame({'Ticker': [], 'Weight': []}) # Initialize empty
+        # The portfolio is carried as parallel arrays; portfolio_df is built once for display
+        tickers = np.array([], dtype=str)
+        weights = np.array([], dtype=np.float64)
 
         # Date Validation
         if start_date >= end_date:
@@ -402,8 +584,8 @@ if submitted:
             st.error("Error: Tickers cannot be empty.")
             valid_input = False
         else:
-            tickers = [t.strip().upper() for t in tickers_string.split(',') if t.strip()]
-            if not tickers: # Check if list is empty after stripping
+            tickers = np.array([t.strip().upper() for t in tickers_string.split(',') if t.strip()], dtype=str)
+            if not tickers.size: # Check if list is empty after stripping
                  st.error("Error: Tickers cannot be empty.")
                  valid_input = False
 
@@ -417,7 +599,7 @@ if submitted:
                      st.error("Error: Weights cannot be empty.")
                      valid_input = False
                  else:
-                     weights = [float(w) for w in weights_raw]
+                     weights = np.array([float(w) for w in weights_raw], dtype=np.float64)
              except ValueError:
                  st.error("Error: Weights must be numeric values.")
                  valid_input = False
@@ -429,24 +611,20 @@ if submitted:
                 valid_input = False
             else:
                 # Check for negative weights
-                if any(w < 0 for w in weights):
+                if (weights < 0).any():
                     st.error("Error: Portfolio weights cannot be negative.")
                     valid_input = False
                 else:
-                    total_weight = sum(weights)
+                    total_weight = weights.sum()
                     if np.isclose(total_weight, 0):
                         st.error("Error: Total weight is zero. Please check weights.")
                         valid_input = False
                     elif not np.isclose(total_weight, 100.0):
                         weights_sum_100 = False
                         st.info(f"Weights sum to {total_weight:.2f}%. They will be normalized to 100%.")
-                        weights = [(w / total_weight) * 100 for w in weights]
+                        weights *= 100.0 / total_weight
                         weights_sum_100 = True # Set to True after normalization
 
-                    # Create DataFrame only if everything is valid
-                    if valid_input:
-                        portfolio_df = pd.DataFrame({'Ticker': tickers, 'Weight': weights})
-
 
         # --- 2. Fetch Data ---
         all_tickers_to_fetch = []
@@ -456,36 +634,31 @@ if submitted:
 
         if valid_input:
             # --- Duplicate-ticker guard ---
-            if benchmark_ticker in portfolio_df['Ticker'].values:
+            keep = tickers != benchmark_ticker
+            if not keep.all():
                 st.warning(f"Benchmark ticker '{benchmark_ticker}' was found in your portfolio. It will be removed from the portfolio calculation to prevent duplication, and weights will be renormalized.")
-                benchmark_weight = portfolio_df.loc[portfolio_df['Ticker'] == benchmark_ticker, 'Weight'].iloc[0]
-                portfolio_df = portfolio_df[portfolio_df['Ticker'] != benchmark_ticker].copy()
+                tickers, weights = tickers[keep], weights[keep]
 
-                if portfolio_df.empty:
+                if not tickers.size:
                     st.error("After removing the benchmark ticker, no tickers remain in the portfolio. Analysis cannot proceed.")
                     valid_input = False # Stop further processing
                 else:
                     # Re-normalize remaining weights
-                    remaining_total_weight = portfolio_df['Weight'].sum()
+                    remaining_total_weight = weights.sum()
                     if np.isclose(remaining_total_weight, 0):
                          st.error("Error: Remaining portfolio weights sum to zero after removing benchmark.")
                          valid_input = False
                     else:
-                        portfolio_df['Weight'] = (portfolio_df['Weight'] / remaining_total_weight) * 100
+                        weights *= 100.0 / remaining_total_weight
                         st.sidebar.subheader("Modified Portfolio (Benchmark Removed)")
-                        st.sidebar.dataframe(portfolio_df.set_index('Ticker').style.format({'Weight': '{:.2f}%'}))
-                        # Update tickers and weights lists as well for consistency if needed later
-                        tickers = portfolio_df['Ticker'].tolist()
-                        weights = portfolio_df['Weight'].tolist()
+                        st.sidebar.dataframe(pd.DataFrame({'Weight': weights}, index=pd.Index(tickers, name='Ticker')).style.format({'Weight': '{:.2f}%'}))
 
 
             # Proceed only if input is still valid after potential benchmark removal
             if valid_input:
-                all_tickers_to_fetch = list(set(portfolio_df['Ticker'].tolist() + [benchmark_ticker])) # Unique list
-                start_str = start_date.strftime('%Y-%m-%d')
-                end_str = end_date.strftime('%Y-%m-%d')
-
-                raw_data, invalid_tickers_fetch = fetch_data(all_tickers_to_fetch, start_str, end_str)
+                # Sorted tuple so the cache key does not depend on the order tickers were typed in
+                all_tickers_to_fetch = tuple(sorted(set(tickers.tolist() + [benchmark_ticker]))) # Unique
+                raw_data, invalid_tickers_fetch = fetch_data(all_tickers_to_fetch, pd.Timestamp(start_date), pd.Timestamp(end_date))
 
                 if raw_data is None or raw_data.empty:
                     st.error(f"Could not fetch valid data for any tickers: {', '.join(all_tickers_to_fetch)}. Check tickers and date range.")
@@ -499,21 +672,19 @@ if submitted:
                         st.warning(f"Could not fetch any data for: {', '.join(invalid_tickers_fetch)}. These were excluded.")
 
                     # --- Filter Portfolio based on Fetched Data ---
-                    original_portfolio_tickers = portfolio_df['Ticker'].tolist()
-                    portfolio_tickers_fetched = [t for t in original_portfolio_tickers if t in fetched_tickers]
-                    missing_portfolio_tickers = [t for t in original_portfolio_tickers if t not in fetched_tickers]
+                    fetched = np.isin(tickers, fetched_tickers)
 
-                    if missing_portfolio_tickers:
-                        st.warning(f"Could not fetch/validate data for portfolio tickers: {', '.join(missing_portfolio_tickers)}. They will be excluded.")
-                        portfolio_df = portfolio_df[portfolio_df['Ticker'].isin(portfolio_tickers_fetched)].copy()
+                    if not fetched.all():
+                        st.warning(f"Could not fetch/validate data for portfolio tickers: {', '.join(tickers[~fetched])}. They will be excluded.")
+                        tickers, weights = tickers[fetched], weights[fetched]
 
-                        if portfolio_df.empty:
+                        if not tickers.size:
                             st.error("Error: No data fetched for any of the specified portfolio tickers after filtering.")
                             data_valid = False # Cannot proceed
                             valid_input = False
                         else:
                             # Re-normalize weights again if some tickers were dropped
-                            current_total_weight = portfolio_df['Weight'].sum()
+                            current_total_weight = weights.sum()
                             if not np.isclose(current_total_weight, 100.0):
                                 st.info("Re-normalizing portfolio weights due to missing ticker data.")
                                 if np.isclose(current_total_weight, 0):
@@ -521,100 +692,47 @@ if submitted:
                                      data_valid = False
                                      valid_input = False
                                 else:
-                                    portfolio_df['Weight'] = (portfolio_df['Weight'] / current_total_weight) * 100
+                                    weights *= 100.0 / current_total_weight
                                     st.sidebar.subheader("Re-Normalized Portfolio (Data Filtered)")
-                                    st.sidebar.dataframe(portfolio_df.set_index('Ticker').style.format({'Weight': '{:.2f}%'}))
-                                    # Update tickers/weights lists if needed
-                                    tickers = portfolio_df['Ticker'].tolist()
-                                    weights = portfolio_df['Weight'].tolist()
+                                    st.sidebar.dataframe(pd.DataFrame({'Weight': weights}, index=pd.Index(tickers, name='Ticker')).style.format({'Weight': '{:.2f}%'}))
 
 
                     # --- Check Benchmark Data ---
                     benchmark_data_valid = False
                     if benchmark_ticker not in fetched_tickers:
                         st.warning(f"Could not fetch/validate data for benchmark ticker: {benchmark_ticker}. Benchmark comparison will be unavailable.")
-                        benchmark_data = None
                     else:
                         # Check if benchmark column has all NaNs even if fetched
                         if raw_data[benchmark_ticker].isnull().all():
                              st.warning(f"Benchmark ticker {benchmark_ticker} fetched but contains only NaN values. Benchmark comparison unavailable.")
-                             benchmark_data = None
                         else:
-                            benchmark_data = raw_data[[benchmark_ticker]].copy() # Keep as DataFrame
                             benchmark_data_valid = True
 
 
         # --- 3. Calculations ---
-        portfolio_daily_returns = None
-        benchmark_daily_returns = None
-        perf_df = pd.DataFrame() # Initialize performance dataframe
-
-        if valid_input and data_valid and not portfolio_df.empty:
-            # Select final valid portfolio data
-            portfolio_data = raw_data[portfolio_df['Ticker'].tolist()].copy()
-
-            # Clear any existing cached data that might be affecting calculations
-            st.cache_data.clear()
-            
-            # Align portfolio_df weights with the columns in portfolio_data
-            # Get weights from the updated portfolio_df
-            aligned_weights = portfolio_df.set_index('Ticker').reindex(portfolio_data.columns)['Weight'] / 100.0 # Convert to decimal
-            
-            # Calculate daily returns
-            portfolio_returns_data = portfolio_data.pct_change().dropna(how='all') # Drop rows where ALL returns are NaN
+        if valid_input and data_valid and tickers.size:
+            portfolio_df = pd.DataFrame({'Ticker': tickers, 'Weight': weights})
+
+            # Returns, growth path and metrics are cached on the inputs, so running the
+            # same analysis again skips straight to the display
+            analysis = compute_analysis(
+                (all_tickers_to_fetch, pd.Timestamp(start_date), pd.Timestamp(end_date), price_digest(raw_data)),
+                tuple(tickers.tolist()),
+                tuple(weights.tolist()),
+                benchmark_ticker if benchmark_data_valid else None,
+                initial_investment,
+                risk_free_rate_input,
+                raw_data
+            )
+            portfolio_daily_returns = analysis['portfolio_daily_returns']
+            perf_df = analysis['perf_df']
+            metrics = analysis['metrics']
 
-            # Force recalculation of weighted daily portfolio return
-            portfolio_daily_returns = (portfolio_returns_data * aligned_weights).sum(axis=1)
-            
             # Verify non-zero returns data has been calculated
-            if portfolio_daily_returns.std() < 1e-10:  # Check if returns are extremely small/constant
+            if analysis['constant_returns']:
                 st.warning("Portfolio returns appear to be constant, check the input data and weights.")
-                
-            # Prepare benchmark returns if valid
-            if benchmark_data_valid and benchmark_data is not None:
-                benchmark_daily_returns = benchmark_data.pct_change().dropna().squeeze() # Convert to Series
-
-                # Align dates using intersection (IMPORTANT!)
-                common_index = portfolio_daily_returns.index.intersection(benchmark_daily_returns.index)
-                portfolio_daily_returns = portfolio_daily_returns.loc[common_index]
-                benchmark_daily_returns = benchmark_daily_returns.loc[common_index]
-                
-                # Verify the data is different (silently check without displaying)
-                correlation = portfolio_daily_returns.corr(benchmark_daily_returns)
-                if np.isclose(correlation, 1.0, atol=1e-4):
-                    st.warning("Portfolio and benchmark returns are nearly identical. Please check your portfolio weights.")
-            else:
-                benchmark_daily_returns = pd.Series(dtype=float) # Ensure it's an empty Series for metric calculation
-
-
-            # --- Calculate cumulative portfolio/benchmark VALUES for visualization ---
-            if not portfolio_daily_returns.empty:
-                perf_df = pd.DataFrame(index=portfolio_daily_returns.index)
-                perf_df['Portfolio_Value'] = initial_investment * (1 + portfolio_daily_returns).cumprod()
-
-                if not benchmark_daily_returns.empty:
-                    # Ensure benchmark calculation starts from the same point if dates were aligned
-                    perf_df['Benchmark_Value'] = initial_investment * (1 + benchmark_daily_returns).cumprod()
-                else:
-                     perf_df['Benchmark_Value'] = np.nan # Add NaN column if no benchmark
-
-                # Add the initial investment row at the beginning for plotting
-                start_row_date = perf_df.index.min() - pd.Timedelta(days=1) # Day before first return
-                initial_values = {'Portfolio_Value': initial_investment}
-                if 'Benchmark_Value' in perf_df.columns and benchmark_data_valid:
-                    initial_values['Benchmark_Value'] = initial_investment
-                else:
-                    initial_values['Benchmark_Value'] = np.nan # Keep NaN if no benchmark
-
-                # Use pd.concat to add the initial row
-                initial_row_df = pd.DataFrame(initial_values, index=[start_row_date])
-                perf_df = pd.concat([initial_row_df, perf_df])
-                perf_df.sort_index(inplace=True)
-
-
-            # --- 4. Calculate Metrics ---
-            # Pass the aligned daily return Series to the metrics function
-            metrics = calculate_metrics(portfolio_daily_returns, benchmark_daily_returns, risk_free_rate_input)
+            if analysis['tracks_benchmark']:
+                st.warning("Portfolio and benchmark returns are nearly identical. Please check your portfolio weights.")
 
             # --- 5. Display Results with improved UI ---
             if valid_input and data_valid and not portfolio_df.empty:
@@ -629,88 +747,59 @@ if submitted:
                 with tabs[0]:
                     # Remove the empty box by directly showing the metrics
                     
-                    # Format metrics and create more visual display
-                    metrics_df = pd.DataFrame(list(metrics.items()), columns=['Metric', 'Value'])
-                    
-                    # Better formatting function
-                    def format_value(x, is_percent=False):
-                        if isinstance(x, (int, float)):
-                            if pd.isna(x): return 'N/A'
-                            if np.isinf(x): 
-                                if x > 0: return '<span class="positive">∞</span>'
-                                return '<span class="negative">-∞</span>'
-                            
-                            formatted = f"{x:.2f}"
-                            if is_percent: formatted += "%"
-                            
-                            # Add color for positive/negative values
-                            if x > 0:
-                                return f'<span class="positive">{formatted}</span>'
-                            elif x < 0:
-                                return f'<span class="negative">{formatted}</span>'
-                            return formatted
-                        return x
-
-                    # Format each metric type appropriately
-                    metrics_df['Value_Formatted'] = metrics_df.apply(
-                        lambda row: format_value(
-                            row['Value'], 
-                            is_percent=("%" in row['Metric'])
-                        ), 
-                        axis=1
+                    # Format all metric values at once: two decimals, a % suffix where the
+                    # name has one, ∞ for unbounded ratios, N/A for missing values and a
+                    # positive/negative class for the sign
+                    metric_names = np.array(list(metrics), dtype=str)
+                    metric_values = np.fromiter(metrics.values(), dtype=np.float64, count=len(metrics))
+                    value_text = np.char.add(
+                        np.char.mod('%.2f', metric_values),
+                        np.where(np.char.find(metric_names, '%') >= 0, '%', '')
                     )
-                    
-                    # Split metrics for side-by-side display
-                    portfolio_metrics_df = metrics_df[metrics_df['Metric'].str.contains("Portfolio", na=False)]
-                    benchmark_metrics_df = metrics_df[metrics_df['Metric'].str.contains("Benchmark", na=False)]
-                    
+                    value_text = np.where(np.isinf(metric_values), np.where(metric_values > 0, '∞', '-∞'), value_text)
+                    sign_class = np.where(metric_values > 0, 'positive', np.where(metric_values < 0, 'negative', ''))
+                    value_cells = np.where(
+                        sign_class != '',
+                        np.char.add(np.char.add(np.char.add('<span class="', sign_class), '">'), np.char.add(value_text, '</span>')),
+                        value_text
+                    )
+                    value_cells = np.where(np.isnan(metric_values), 'N/A', value_cells)
+
+                    def metrics_table(group: str) -> str:
+                        """HTML table of the metrics whose name contains group, with group dropped from the label."""
+                        in_group = np.char.find(metric_names, group) >= 0
+                        labels = np.char.replace(metric_names[in_group], f'{group} ', '')
+                        rows = ''.join(
+                            f'<tr><td style="padding:8px;">{label}</td><td align="right" style="padding:8px;">{cell}</td></tr>'
+                            for label, cell in zip(labels, value_cells[in_group])
+                        )
+                        return f'<table width="100%" style="background-color:#1E1E1E; border-radius:5px; padding:10px;">{rows}</table>'
+
                     # Make compact metrics display
                     col_m1, col_m2 = st.columns(2)
                     with col_m1:
                         st.markdown('<h3 class="sub-header">Portfolio Performance</h3>', unsafe_allow_html=True)
-                        
-                        # Create a cleaner HTML table for metrics
-                        html_table = '<table width="100%" style="background-color:#1E1E1E; border-radius:5px; padding:10px;">'
-                        for _, row in portfolio_metrics_df.iterrows():
-                            metric_name = row['Metric'].replace('Portfolio ', '')
-                            html_table += f'<tr><td style="padding:8px;">{metric_name}</td><td align="right" style="padding:8px;">{row["Value_Formatted"]}</td></tr>'
-                        html_table += '</table>'
-                        
-                        st.markdown(html_table, unsafe_allow_html=True)
-                    
+                        st.markdown(metrics_table('Portfolio'), unsafe_allow_html=True)
+
                     with col_m2:
-                        if not benchmark_metrics_df.empty and benchmark_data_valid:
+                        if benchmark_data_valid:
                             st.markdown(f'<h3 class="sub-header">Benchmark Performance ({benchmark_ticker})</h3>', unsafe_allow_html=True)
-                            
-                            # Create a cleaner HTML table for metrics
-                            html_table = '<table width="100%" style="background-color:#1E1E1E; border-radius:5px; padding:10px;">'
-                            for _, row in benchmark_metrics_df.iterrows():
-                                metric_name = row['Metric'].replace('Benchmark ', '')
-                                html_table += f'<tr><td style="padding:8px;">{metric_name}</td><td align="right" style="padding:8px;">{row["Value_Formatted"]}</td></tr>'
-                            html_table += '</table>'
-                            
-                            st.markdown(html_table, unsafe_allow_html=True)
+                            st.markdown(metrics_table('Benchmark'), unsafe_allow_html=True)
                         else:
                             st.markdown(f'<h3 class="sub-header">Benchmark Data ({benchmark_ticker})</h3>', unsafe_allow_html=True)
                             st.warning("Benchmark metrics unavailable (data could not be fetched)")
                         
                         # Add metric explanations
                         with st.expander("📘 What do these metrics mean?"):
-                            st.markdown("""
-                            * **Total Return (%)**: Overall percentage gain/loss over the entire period
-                            * **Annualized Return (%)**: Return averaged to an annual basis
-                            * **Annualized Volatility (%)**: Measure of risk/variability in returns
-                            * **Sharpe Ratio**: Risk-adjusted return (higher is better)
-                            * **Sortino Ratio**: Similar to Sharpe but only considers downside risk
-                            * **Max Drawdown (%)**: Largest percentage drop from peak to trough
-                            """)
+                            st.markdown(_METRICS_HTML, unsafe_allow_html=True)
                 
                 # --- Tab 2: Growth Chart ---
                 with tabs[1]:
                     if not portfolio_daily_returns.empty and 'Portfolio_Value' in perf_df.columns:
-                        # Display key summary metrics
-                        start_value = perf_df['Portfolio_Value'].iloc[0]
-                        end_value = perf_df['Portfolio_Value'].iloc[-1]
+                        # Display key summary metrics, all read from one array of portfolio values
+                        portfolio_values = perf_df['Portfolio_Value'].to_numpy()
+                        start_value = portfolio_values[0]
+                        end_value = portfolio_values[-1]
                         growth = end_value - start_value
                         total_return = ((end_value / start_value) - 1) * 100 if start_value > 0 else 0
                         
@@ -734,9 +823,11 @@ if submitted:
                         fig_growth = go.Figure()
                         
                         # Portfolio trace with better style
+                        # Plotly takes the arrays directly; no per-point Python objects
+                        dates = perf_df.index.to_numpy()
                         fig_growth.add_trace(go.Scatter(
-                            x=perf_df.index.tolist(),
-                            y=perf_df['Portfolio_Value'].tolist(),
+                            x=dates,
+                            y=portfolio_values,
                             name='Portfolio',
                             mode='lines',
                             line=dict(color='#1E88E5', width=3)
@@ -745,43 +836,23 @@ if submitted:
                         # Add benchmark if available
                         if 'Benchmark_Value' in perf_df.columns and benchmark_data_valid:
                             fig_growth.add_trace(go.Scatter(
-                                x=perf_df.index.tolist(),
-                                y=perf_df['Benchmark_Value'].tolist(),
+                                x=dates,
+                                y=perf_df['Benchmark_Value'].to_numpy(),
                                 name=f'{benchmark_ticker}',
                                 mode='lines',
                                 line=dict(color='#FFA000', width=2)
                             ))
                         
                         # Better y-axis range
-                        min_value = max(0, perf_df['Portfolio_Value'].min() * 0.9)
-                        max_value = perf_df['Portfolio_Value'].max() * 1.1
+                        min_value = max(0, portfolio_values.min() * 0.9)
+                        max_value = portfolio_values.max() * 1.1
                         min_value = min(min_value, initial_investment * 0.5)
                         max_value = max(max_value, initial_investment * 1.5)
                         
                         # Enhanced layout
                         fig_growth.update_layout(
-                            title=None,
-                            xaxis_title='Date',
-                            yaxis=dict(
-                                title='Value ($)',
-                                tickprefix='$',
-                                range=[min_value, max_value],
-                                autorange=False
-                            ),
-                            template='plotly_white',
-                            hovermode='x unified',
-                            height=500,
-                            legend=dict(
-                                orientation="h",
-                                yanchor="bottom",
-                                y=1.02,
-                                xanchor="right",
-                                x=1
-                            ),
-                            margin=dict(l=60, r=30, t=30, b=60),
-                            paper_bgcolor='rgba(0,0,0,0)',  # Transparent background
-                            plot_bgcolor='rgba(0,0,0,0)',   # Transparent plot background
-                            font=dict(color='#E0E0E0')      # White text
+                            yaxis=dict(_GROWTH_YAXIS, range=[min_value, max_value]),
+                            **_GROWTH_LAYOUT
                         )
                         
                         # Add initial investment line
@@ -829,23 +900,23 @@ if submitted:
                             })
                             
                             # Format with colors based on weight - using white text
-                            def highlight_weights(val):
-                                if isinstance(val, float):
-                                    normalized = min(1.0, val / max(allocation_df['Weight (%)']))
-                                    r, g, b = 30, 72, 115  # Dark blue base color
-                                    r2, g2, b2 = 66, 133, 200  # Lighter blue for highest weights
-                                    # Interpolate colors
-                                    r_val = int(r + normalized * (r2 - r))
-                                    g_val = int(g + normalized * (g2 - g))
-                                    b_val = int(b + normalized * (b2 - b))
-                                    return f'background-color: rgb({r_val}, {g_val}, {b_val}); color: white'
-                                return 'color: white'  # Ensure all text is white
+                            # Interpolate every row's color at once, from a dark blue base
+                            # to a lighter blue for the highest weight
+                            weight_values = allocation_df['Weight (%)'].to_numpy(dtype=np.float64)
+                            normalized = np.minimum(1.0, weight_values / weight_values.max())[:, None]
+                            base_rgb = np.array([30, 72, 115])
+                            top_rgb = np.array([66, 133, 200])
+                            weight_rgb = (base_rgb + normalized * (top_rgb - base_rgb)).astype(int)
+                            weight_styles = [
+                                f'background-color: rgb({r_val}, {g_val}, {b_val}); color: white'
+                                for r_val, g_val, b_val in weight_rgb
+                            ]
                             
                             # Add explicit styling for all table elements
                             st.dataframe(
                                 allocation_df.style
                                 .format({'Weight (%)': '{:.2f}'})
-                                .applymap(highlight_weights)  # Apply to all cells
+                                .apply(lambda column: weight_styles, subset=['Weight (%)'])  # Text is already white via set_properties
                                 .set_properties(**{
                                     'font-size': '16px', 
                                     'text-align': 'center', 
@@ -871,9 +942,6 @@ if submitted:
                             labels = portfolio_df['Ticker'].tolist()
                             values = portfolio_df['Weight'].tolist()
                             
-                            # Custom color sequence for pie chart
-                            colors = px.colors.qualitative.Safe
-                            
                             fig_pie = go.Figure(data=[go.Pie(
                                 labels=labels,
                                 values=values,
@@ -881,25 +949,11 @@ if submitted:
                                 textinfo='label+percent',
                                 hoverinfo='label+percent+value',
                                 hovertemplate='<b>%{label}</b><br>Weight: %{value:.2f}%<br>Percentage: %{percent}<extra></extra>',
-                                marker=dict(colors=colors, line=dict(color='#000000', width=2))
+                                marker=dict(colors=_PIE_COLORS, line=dict(color='#000000', width=2))
                             )])
                             
                             # Clean layout with no title
-                            fig_pie.update_layout(
-                                showlegend=True,
-                                height=400,
-                                paper_bgcolor='rgba(0,0,0,0)',  # Transparent background
-                                plot_bgcolor='rgba(0,0,0,0)',   # Transparent plot area
-                                margin=dict(l=0, r=0, t=0, b=0),  # No margins
-                                legend=dict(
-                                    orientation="h",
-                                    yanchor="bottom",
-                                    y=-0.1,
-                                    xanchor="center",
-                                    x=0.5,
-                                    font=dict(color="white")
-                                )
-                            )
+                            fig_pie.update_layout(**_PIE_LAYOUT)
                             
                             st.plotly_chart(fig_pie, use_container_width=True)
                     else:
@@ -9,7 +9,6 @@ Simply run this file and the application will start in your browser.
 """
 
 import os
-import subprocess
 import sys
 
 def main():
@@ -30,9 +29,9 @@ def main():
         cmd = [sys.executable, "-m", "streamlit", "run", app_path]
         print(f"Starting Portfolio Analyzer: {' '.join(cmd)}")
         
-        # Use subprocess to run the command
-        subprocess.run(cmd)
-        return 0
+        # Replace this process with Streamlit, run from the app's own directory
+        os.chdir(script_dir)
+        os.execvp(sys.executable, cmd)
     
     except Exception as e:
         print(f"Error launching Portfolio Analyzer: {e}")
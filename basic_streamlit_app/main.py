@@ -2,7 +2,6 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import plotly.express as px  # For the pie chart
 
 # Cache the data loading function to improve app performance
@@ -20,23 +19,81 @@ def load_data():
 
     # Clean the headline column by filling NA values and ensuring string type
     df['headline'] = df['headline'].fillna("").astype(str)
+
+    # Lowercase the labels once here, so the sentiment filter is a plain equality;
+    # as a categorical the three labels are stored once and compared/grouped by code
+    df['label'] = df['label'].str.lower().astype('category')
     return df
 
 # Cache the vectorization process to improve performance
+# Keyed on the sentiment string alone, so a rerun neither hashes the headlines nor
+# unpickles a copy of the fitted matrix; each sentiment is fitted once
+@st.cache_resource
+def vectorize_headlines(sentiment_filter):
+    """
+    Convert the headlines with the selected sentiment to TF-IDF vectors for similarity comparison.
+    
+    Args:
+        sentiment_filter (str): Sentiment to keep, or "All" for the whole corpus
+        
+    Returns:
+        tuple: (filtered DataFrame, TfidfVectorizer, sparse matrix of TF-IDF vectors);
+        the vectorizer and matrix are None when no headline has the sentiment
+    """
+    df = load_data()
+    if sentiment_filter != "All":
+        df = df[df["label"] == sentiment_filter.lower()]
+    if df.empty:
+        return df, None, None
+
+    # norm='l2' (the default, spelled out because main() relies on it) makes every
+    # vector unit length, so a plain dot product is already the cosine similarity;
+    # float32 halves the matrix that every query's dot product has to read
+    vectorizer = TfidfVectorizer(norm='l2', dtype=np.float32)
+    vectors = vectorizer.fit_transform(df['headline'])
+    # Put the CSR matrix in canonical form (sorted column indices, no duplicates) once,
+    # so the per-query dot product walks each row in order
+    vectors.sum_duplicates()
+    return df, vectorizer, vectors
+
+def _top_sentiment_scores(similarities, label_codes, k, n_labels):
+    """
+    Sum the similarities of the k most similar headlines per sentiment label.
+    
+    Args:
+        similarities (numpy.ndarray): Similarity of every headline to the query
+        label_codes (numpy.ndarray): Sentiment category code of every headline
+        k (int): Number of most similar headlines to use
+        n_labels (int): Number of sentiment categories
+        
+    Returns:
+        tuple: (summed similarity per label, number of top headlines per label)
+    """
+    k = min(k, similarities.size)
+    # argpartition only separates the k largest similarities; their order doesn't matter for the sums
+    top_indices = np.argpartition(similarities, -k)[-k:]
+    top_codes = label_codes[top_indices]
+    return (np.bincount(top_codes, weights=similarities[top_indices], minlength=n_labels),
+            np.bincount(top_codes, minlength=n_labels))
+
+# Cache the pie chart so reruns with the same distribution skip building the figure
 @st.cache_data
-def vectorize_headlines(headlines):
+def sentiment_pie(sentiment_shares):
     """
-    Convert headlines to TF-IDF vectors for similarity comparison.
+    Build the weighted sentiment pie chart.
     
     Args:
-        headlines (pandas.Series): Series of headline texts
+        sentiment_shares (tuple): (sentiment, percentage) pairs, with the percentages
+            rounded to two decimals so that near-identical distributions share a figure
         
     Returns:
-        tuple: (TfidfVectorizer, sparse matrix of TF-IDF vectors)
+        plotly.graph_objects.Figure: Pie chart of the sentiment percentages
     """
-    vectorizer = TfidfVectorizer()
-    vectors = vectorizer.fit_transform(headlines)
-    return vectorizer, vectors
+    sentiment_percentages = pd.DataFrame(list(sentiment_shares), columns=["Sentiment", "Percentage"])
+    return px.pie(sentiment_percentages, values='Percentage', names='Sentiment',
+                  title="Weighted Sentiment Distribution",
+                  color="Sentiment",
+                  color_discrete_map={"positive": "green", "neutral": "gray", "negative": "red"})
 
 def main():
     """
@@ -46,9 +103,6 @@ def main():
     st.title("Headline Finder with Sentiment Analysis")
     st.write("Enter a phrase below and the app will find matching headlines from the corpus.")
 
-    # Load the dataset
-    df = load_data()
-    
     # Create sidebar filters for user interaction
     st.sidebar.header("Filters")
     
@@ -67,18 +121,19 @@ def main():
         step=0.01
     )
     
-    # Apply sentiment filter if selected
-    if sentiment_filter != "All":
-        df = df[df["label"].str.lower() == sentiment_filter.lower()]
-        if df.empty:
-            st.error("No headlines with the selected sentiment found.")
-            return
+    # The preview is opt-in, so typing a phrase does not re-send the table each rerun
+    show_preview = st.sidebar.checkbox("Show data preview")
+    
+    # Load the dataset, apply the sentiment filter and vectorize the headlines
+    # for similarity comparison
+    df, vectorizer, headline_vectors = vectorize_headlines(sentiment_filter)
+    if df.empty:
+        st.error("No headlines with the selected sentiment found.")
+        return
 
     # Show data preview to user
-    st.write("Data preview:", df.head())
-    
-    # Vectorize headlines for similarity comparison
-    vectorizer, headline_vectors = vectorize_headlines(df['headline'])
+    if show_preview:
+        st.write("Data preview:", df.head())
     
     # Get user input for phrase to search
     user_input = st.text_input("Enter a phrase:")
@@ -89,20 +144,20 @@ def main():
     # Process user input if provided
     if user_input:
         # Convert user input to vector and calculate similarity with all headlines
+        # Both sides are L2-normalized, so one sparse matrix-vector product gives the
+        # cosine similarities without re-normalized copies of the headline matrix
         user_vector = vectorizer.transform([user_input])
-        similarities = cosine_similarity(user_vector, headline_vectors)
-        similarities_array = similarities.flatten()
+        similarities_array = (headline_vectors @ user_vector.T).toarray().ravel()
         
-        # Find the highest similarity score
-        best_similarity = np.max(similarities_array)
+        # Find the best match and its similarity score in one pass
+        best_idx = int(np.argmax(similarities_array))
+        best_similarity = float(similarities_array[best_idx])
         
         # TAB 1: Show the closest headline
         with tab1:
             if best_similarity < similarity_threshold:
                 st.warning("No headline found with similarity above the threshold.")
             else:
-                # Get the index of the best match
-                best_idx = np.argmax(similarities_array)
                 best_headline = df.iloc[best_idx]["headline"]
                 best_label = df.iloc[best_idx]["label"]
                 
@@ -118,32 +173,30 @@ def main():
             if best_similarity < similarity_threshold:
                 st.warning("No headline found with similarity above the threshold.")
             else:
-                # Get top 100 headlines by similarity
-                sorted_indices = np.argsort(similarities_array)[::-1]
-                top_n = min(100, len(sorted_indices))
-                top_indices = sorted_indices[:top_n]
-                
-                # Create dataframe with top matches
-                top_df = df.iloc[top_indices].copy()
-                top_df["similarity"] = similarities_array[top_indices]
-                
-                # Calculate weighted sentiment scores based on similarity
-                sentiment_scores = top_df.groupby("label")["similarity"].sum()
+                # Calculate weighted sentiment scores of the top 100 headlines by similarity
+                # in one pass over the similarities; sentiments absent from the top
+                # headlines are left out, as before
+                sentiments = df["label"].cat.categories
+                sentiment_scores, sentiment_counts = _top_sentiment_scores(
+                    similarities_array, df["label"].cat.codes.to_numpy(), 100, len(sentiments)
+                )
+                present = sentiment_counts > 0
                 total_score = sentiment_scores.sum()
                 
                 # Calculate percentage contribution of each sentiment
-                sentiment_percentages = (sentiment_scores / total_score * 100).reset_index()
-                sentiment_percentages.columns = ["Sentiment", "Percentage"]
+                with np.errstate(invalid='ignore'):  # No overlap at all leaves every share undefined
+                    sentiment_percentages = pd.DataFrame({
+                        "Sentiment": sentiments[present],
+                        "Percentage": sentiment_scores[present] / total_score * 100
+                    })
                 
                 # Display tabular results
                 st.subheader("Weighted Sentiment Distribution (Top 100 Headlines)")
                 st.write(sentiment_percentages)
                 
                 # Create pie chart visualization
-                fig = px.pie(sentiment_percentages, values='Percentage', names='Sentiment',
-                             title="Weighted Sentiment Distribution",
-                             color="Sentiment",
-                             color_discrete_map={"positive": "green", "neutral": "gray", "negative": "red"})
+                fig = sentiment_pie(tuple(zip(sentiment_percentages["Sentiment"],
+                                              sentiment_percentages["Percentage"].round(2))))
                 st.plotly_chart(fig, use_container_width=True)
     
     # Add detailed instructions and explanation section